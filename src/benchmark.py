@@ -0,0 +1,274 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import yaml
+from timing import LatencyStats, RequestTrace
+
+FAKE_COMPLETION = "SELECT id, name FROM customers WHERE created_at >= '2024-01-01' ORDER BY created_at DESC LIMIT 10;"
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+# Peak resident set size of this process in MB (None where resource is unavailable)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible /chat/completions with a fixed answer and configurable delays."""
+
+    # HTTP/1.1 with chunked frames, so clients see each SSE event when it is sent
+    protocol_version = "HTTP/1.1"
+    ttfb_ms = 150
+    token_ms = 5
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # the client stops reading at [DONE] and drops the kept-alive connection
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.ttfb_ms / 1000)
+        tokens = [piece + " " for piece in FAKE_COMPLETION.split(" ")]
+
+        if not body.get("stream"):
+            for _ in tokens:
+                time.sleep(self.token_ms / 1000)
+            payload = json.dumps({"choices": [{"message": {"content": FAKE_COMPLETION}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            chunk = {"choices": [{"delta": {"content": token}}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(self.token_ms / 1000)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")  # terminating zero-length chunk
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+def start_fake_llm(ttfb_ms, token_ms):
+    handler = type("BenchmarkLLMHandler", (FakeLLMHandler,), {"ttfb_ms": ttfb_ms, "token_ms": token_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+# Replay corpus: one fragment per line from a file, or a seeded sample of dataset prompts
+def load_corpus(config, corpus_path=None, size=200, seed=42):
+    if corpus_path:
+        with open(corpus_path, encoding="utf-8") as f:
+            fragments = [line.strip() for line in f if line.strip()]
+        return fragments[:size], pd.DataFrame()
+    df = pd.read_csv(config["data"]["loc"])
+    sample = df.sample(n=min(size, len(df)), random_state=seed)
+    return sample["sql_prompt"].astype(str).tolist(), sample
+
+# SQLite stand-in built from the sampled rows' CREATE/INSERT context
+def build_standin_db(path, sample, max_tables=50):
+    conn = sqlite3.connect(path)
+    created = 0
+    if "sql_context" in sample:
+        for context in sample["sql_context"].dropna():
+            try:
+                conn.executescript(context)
+                created += 1
+            except sqlite3.Error:
+                continue  # dialect-specific DDL the stand-in cannot take
+            if created >= max_tables:
+                break
+    if not created:
+        conn.execute("CREATE TABLE IF NOT EXISTS customers (id INTEGER PRIMARY KEY, name TEXT, created_at TEXT)")
+        conn.execute("INSERT INTO customers (name, created_at) VALUES ('Ada', '2024-01-02'), ('Lin', '2024-02-03')")
+    conn.commit()
+    conn.close()
+    return {"type": "sqlite", "name": path, "sample_rows": 2, "sample_workers": 1}
+
+def run_concurrent(fn, fragments, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fn, fragments))
+    elapsed = time.perf_counter() - start
+    return round(len(fragments) / elapsed, 2) if elapsed else None
+
+# Runs in a fresh process so cold start and peak RSS belong to one backend
+def run_backend(config_path, db_cfg, fragments, concurrency, stream):
+    from embeddings import get_embedding_service
+    from retrieve_context import get_retriever
+    from suggestion_engine import SuggestionEngine
+
+    config = read_param(config_path)
+    result = {"vector_store": config["vector_store"]["type"], "cold_start_ms": {}}
+    cold = result["cold_start_ms"]
+
+    start = time.perf_counter()
+    get_embedding_service(config)
+    cold["embedding_model"] = round((time.perf_counter() - start) * 1000, 2)
+
+    start = time.perf_counter()
+    retriever = get_retriever(config_path)
+    cold["retriever"] = round((time.perf_counter() - start) * 1000, 2)
+
+    start = time.perf_counter()
+    engine = SuggestionEngine(config, config_path, db_cfg=db_cfg)
+    if engine.schema_cache:
+        engine.schema_cache.refresh(force=True)
+    cold["engine"] = round((time.perf_counter() - start) * 1000, 2)
+    cold["first_request"] = None
+
+    # retrieval alone, one query at a time and then concurrently
+    retrieval = LatencyStats(window=len(fragments))
+    for fragment in fragments:
+        trace = RequestTrace()
+        retriever.search(fragment, trace=trace)
+        retrieval.add(trace, trace.elapsed_ms())
+    result["retrieval"] = {
+        "stages": retrieval.summary(),
+        "qps": run_concurrent(lambda q: retriever.search(q), fragments, concurrency)
+    }
+
+    # full suggestion path against the fake LLM
+    on_token = (lambda piece: None) if stream else None
+    suggestion = LatencyStats(window=len(fragments))
+    for i, fragment in enumerate(fragments):
+        trace = RequestTrace()
+        engine.get_real_suggestion(fragment, on_token=on_token, session_id="benchmark", trace=trace)
+        if i == 0:
+            cold["first_request"] = round(trace.elapsed_ms(), 2)
+        suggestion.add(trace, trace.elapsed_ms())
+    result["suggestion"] = {
+        "stages": suggestion.summary(),
+        "qps": run_concurrent(
+            lambda q: engine.get_real_suggestion(q, on_token=on_token, session_id="benchmark"), fragments, concurrency
+        )
+    }
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def benchmark(config_path, stores=None, corpus_path=None, size=200, concurrency=4, llm_ttfb_ms=150, llm_token_ms=5, output_dir="reports/benchmarks"):
+    config = read_param(config_path)
+    stores = stores or [config["vector_store"]["type"]]
+    fragments, sample = load_corpus(config, corpus_path, size)
+    print(f"🧪 Replaying {len(fragments)} fragments against {', '.join(stores)}")
+
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    server, base_url = start_fake_llm(llm_ttfb_ms, llm_token_ms)
+    workdir = tempfile.mkdtemp(prefix="querypilot-bench-")
+    db_cfg = build_standin_db(os.path.join(workdir, "standin.sqlite"), sample)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "embedding_model": config["embedding_model"],
+        "corpus_size": len(fragments),
+        "concurrency": concurrency,
+        "llm": {"ttfb_ms": llm_ttfb_ms, "token_ms": llm_token_ms, "stream": config["llm"].get("stream", False)},
+        "backends": {}
+    }
+
+    ctx = multiprocessing.get_context("spawn")
+    for store in stores:
+        # per-backend config: fake LLM, stand-in schema, no response cache.
+        # Every phase replays the same fragments, and they come from the
+        # indexed corpus: the query-embedding LRU and the lexical short-circuit
+        # would turn later phases into cache hits and skip the encoder.
+        bench_config = read_param(config_path)
+        bench_config["vector_store"]["type"] = store
+        bench_config["llm"]["base_url"] = base_url
+        bench_config["llm"]["max_retries"] = 0
+        bench_config.setdefault("suggestion_cache", {})["enable"] = False
+        bench_config.setdefault("embedding", {})["cache_size"] = 0
+        bench_config.setdefault("lexical", {}).setdefault("short_circuit", {})["enable"] = False
+        bench_config.setdefault("schema_cache", {})["dir"] = os.path.join(workdir, "schema_cache")
+        bench_path = os.path.join(workdir, f"params_{store}.yaml")
+        with open(bench_path, "w") as f:
+            yaml.safe_dump(bench_config, f)
+
+        print(f"⏱️ Benchmarking {store}...")
+        try:
+            with ctx.Pool(1) as pool:
+                report["backends"][store] = pool.apply(
+                    run_backend, (bench_path, db_cfg, fragments, concurrency, bench_config["llm"].get("stream", False))
+                )
+        except Exception as e:
+            print(f"[ERROR] {store} benchmark failed: {e}")
+            report["backends"][store] = {"error": str(e)}
+
+    server.shutdown()
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Benchmark written to {output_path}")
+    return report
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--config", default="params.yaml")
+    args.add_argument("--stores", nargs="+", default=None, help="vector stores to compare, e.g. faiss chromadb")
+    args.add_argument("--corpus", default=None, help="file with one SQL fragment per line")
+    args.add_argument("--size", type=int, default=200)
+    args.add_argument("--concurrency", type=int, default=4)
+    args.add_argument("--llm-ttfb-ms", type=float, default=150)
+    args.add_argument("--llm-token-ms", type=float, default=5)
+    args.add_argument("--output-dir", default="reports/benchmarks")
+    parsed_args = args.parse_args()
+
+    report = benchmark(
+        parsed_args.config,
+        stores=parsed_args.stores,
+        corpus_path=parsed_args.corpus,
+        size=parsed_args.size,
+        concurrency=parsed_args.concurrency,
+        llm_ttfb_ms=parsed_args.llm_ttfb_ms,
+        llm_token_ms=parsed_args.llm_token_ms,
+        output_dir=parsed_args.output_dir
+    )
+
+    for store, result in report["backends"].items():
+        if "error" in result:
+            print(f"\n🔹 {store}: failed ({result['error']})")
+            continue
+        total = result["suggestion"]["stages"].get("total", {})
+        print(f"\n🔹 {store}")
+        print(f"  - Cold start: {result['cold_start_ms']}")
+        print(f"  - Suggestion p50/p95/p99: {total.get('p50')} / {total.get('p95')} / {total.get('p99')} ms")
+        print(f"  - Suggestion QPS: {result['suggestion']['qps']}  Retrieval QPS: {result['retrieval']['qps']}")
+        print(f"  - Peak RSS: {result['peak_rss_mb']} MB")
@@ -1,179 +1,365 @@
 import pandas as pd
-import faiss
+import numpy as np
 import chromadb
-import pinecone
 import yaml
 config = yaml.safe_load(open("params.yaml"))
 if config["vector_store"]["type"] == "pinecone":
     from pinecone import Pinecone, ServerlessSpec
-from dotenv import dotenv_values
-import pickle
-from sentence_transformers import SentenceTransformer
+from embeddings import get_embedding_service
+from metadata_store import MetadataStoreWriter, row_keys
+from lexical_index import LexicalIndexWriter
+from sql_normalize import SKELETON_VERSION, sql_skeleton
+from dedupe_corpus import corpus_path
+from faiss_indexes import (
+    add_vectors, get_faiss_config, make_faiss_index, needs_training,
+    read_faiss_index, train_faiss_index, uses_rerank, write_faiss_index
+)
+from vector_file import VectorFileWriter
+import copy
+import hashlib
+import json
 import os
 import argparse
 import yaml
 
+CHROMA_MAX_BATCH = 5461  # ChromaDB's max batch size
+
 # defination for reading YAML config
 def read_param(config_path):
     with open(config_path) as yaml_file:
         config = yaml.safe_load(yaml_file)
         return config
 
-# Load metadata from pickle
-def load_metadata_from_pickle(metadata_path):
-    with open(metadata_path, "rb") as f:
-        metadata = pickle.load(f)
-    print(f"📄 Loaded {len(metadata)} metadata entries from {metadata_path}")
-    return metadata
-
 # dynamic embedding function
-def get_embeddings(texts, model_name):
-    print(f"Loading embedding model: {model_name}")
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(texts, show_progress_bar=True)
+def get_embeddings(texts, config):
+    embeddings = get_embedding_service(config).encode(texts, show_progress_bar=True)
     return embeddings
 
-# building FAISS backend
-def build_faiss_index(df,texts, embeddings, config):
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-
-    index_path = config["vector_store"]["path_to_save"]
-    metadata_path = config["vector_store"]["metadata_path"]
-
-    os.makedirs(os.path.dirname(index_path), exist_ok=True)
-    faiss.write_index(index, index_path)
-
-    with open(metadata_path, "wb") as f:
-        pickle.dump(df.to_dict("records"), f)
-
-    print("FAISS vector store and metadata saved.")
-
-# building ChromeDB
-def build_chromedb_index(df,texts, embeddings, config):
-    persist_dir = config["vector_store"]["persist_directory"]
-    collection_name = config["vector_store"]["collection_name_chroma"]
-    logical_batch_size = config["vector_store"].get("chroma_batch_size", 100000)
-    chroma_max_batch = 5461  # ChromaDB's max batch size
-
-    # Get metadata
-    metadatas = load_metadata_from_pickle(config["vector_store"]["metadata_path"])
-
-    print("🧠 Logical batch size:", logical_batch_size)
-
-    # Create directory if it doesn't exist
-    os.makedirs(persist_dir, exist_ok=True)
-
-    # Initialize Chroma client with PersistentClient instead
-    client = chromadb.PersistentClient(path=persist_dir)
-
-    # Create or get collection
-    collection = client.get_or_create_collection(name=collection_name)
-
-    # Create IDs
-    ids = [f"id_{i}" for i in range(len(texts))]
-
-    # Step through logical batch size
-    for i in range(0, len(texts), logical_batch_size):
-        batch_texts = texts[i:i + logical_batch_size]
-        batch_embeddings = embeddings[i:i + logical_batch_size]
-        batch_ids = ids[i:i + logical_batch_size]
-        batch_metadata = metadatas[i:i + logical_batch_size]
-
-        # Sub-batch to fit ChromaDB's max limit
-        for j in range(0, len(batch_texts), chroma_max_batch):
-            sub_texts = batch_texts[j:j + chroma_max_batch]
-            sub_embeds = batch_embeddings[j:j + chroma_max_batch]
-            sub_ids = batch_ids[j:j + chroma_max_batch]
-            sub_meta = batch_metadata[j:j + chroma_max_batch]
+# stream the dataset in fixed-size chunks so the corpus never sits in RAM at once
+def iter_chunks(config):
+    chunk_size = config.get("build", {}).get("chunk_size", 10000)
+    return pd.read_csv(corpus_path(config), chunksize=chunk_size)
 
-            collection.add(
-                documents=sub_texts,
-                embeddings=sub_embeds.tolist(),
-                ids=sub_ids,
-                metadatas=sub_meta
-            )
-
-        print(f"✅ Uploaded logical batch {i}-{i + len(batch_texts)}")
-
-    print(f"✅ Stored {len(texts)} items in ChromaDB at '{persist_dir}'")
-
-    # Verify collection count
-    count = collection.count()
-    print(f"✅ Collection contains {count} documents")
-
-# building pinecone
-def build_pinecone_index(df,texts, embeddings, config):
-    # Get secrets from environment
-    api_key = os.getenv("PINECONE_API_KEY")
-    environment = os.getenv("PINECONE_ENVIRONMENT")
-
-    # Config values
-    index_name = config["vector_store"]["index_name"]
-    dimension = config["vector_store"]["dimension"]
-    namespace = config["vector_store"]["namespace"]
-    metric = config["vector_store"]["metric"]
-    batch_size = config["vector_store"]["batch_size"]
-
-    if not api_key:
-        raise ValueError("Missing PINECONE_API_KEY .env")
-
-    # Initialize Pinecone client
-    pc = Pinecone(api_key=api_key)
-
-    # Create index if it doesn't exist
-    if index_name not in pc.list_indexes().names():
-        pc.create_index(
-            name=index_name,
-            dimension=dimension,
-            metric=metric,
-            spec=ServerlessSpec(
-                cloud="aws",
-                region=environment
-            )
-        )
-        print(f"✅ Created Pinecone index: {index_name}")
-
-    # Connect to the index
-    index = pc.Index(index_name)
-
-    # Prepare and upload vectors
-    vectors = [
-        (f"id-{i}", embedding.tolist(), {"text": text})
-        for i, (text, embedding) in enumerate(zip(texts, embeddings))
+# content hash per row, used to detect new or changed rows between builds
+def row_hashes(df):
+    return [
+        hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        for record in df.to_dict("records")
     ]
 
-    for i in range(0, len(vectors), batch_size):
-        index.upsert(vectors=vectors[i:i + batch_size], namespace=namespace)
-
-    print(f"Uploaded {len(vectors)} vectors to Pinecone index '{index_name}' in namespace '{namespace}'")
-
-
-# core controller
-def build_vector_store(config_path):
+# the manifest also records what the store was built with, so a config change forces a full build
+def manifest_header(config):
+    embed_cfg = config.get("embedding", {})
+    backend = embed_cfg.get("backend", "torch")
+    sql_index = bool(config["vector_store"].get("sql_index", {}).get("enable", False))
+    header = {
+        "store": config["vector_store"]["type"].lower(),
+        "embedding_model": config["embedding_model"],
+        "embedding_backend": backend,
+        "faiss_index_type": get_faiss_config(config).get("index_type", "flat"),
+        "faiss_rerank": uses_rerank(get_faiss_config(config)),
+        "sql_index": sql_index
+    }
+    # fp32 and int8 ONNX weights give slightly different vectors
+    if backend == "onnx":
+        header["embedding_quantized"] = bool((embed_cfg.get("onnx") or {}).get("quantized", False))
+    # skeleton embeddings go stale when the normalizer changes
+    if sql_index:
+        header["sql_skeleton"] = SKELETON_VERSION
+    return header
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest_path, config, keys, hashes):
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    manifest = {**manifest_header(config), "rows": {str(k): h for k, h in zip(keys, hashes)}}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+# FAISS backend
+class FaissStoreWriter:
+    def __init__(self, config, incremental=False):
+        self.faiss_cfg = get_faiss_config(config)
+        self.index_path = config["vector_store"]["path_to_save"]
+        self.index = read_faiss_index(self.index_path, self.faiss_cfg) if incremental else None
+        # compact codes are re-ranked with full-precision vectors kept next to the index
+        self.vectors = None
+        if uses_rerank(self.faiss_cfg):
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            self.vectors = VectorFileWriter(f"{self.index_path}.vectors", append=incremental)
+        # IVF/PQ must be trained before anything is added, so early chunks wait here
+        self._pending = []
+        self._pending_rows = 0
+
+    def delete(self, keys):
+        if self.vectors is not None:
+            self.vectors.delete(keys)
+        if len(keys) and self.index is not None:
+            removed = self.index.remove_ids(np.asarray(keys, dtype=np.int64))
+            print(f"🗑️ Removed {removed} vectors from FAISS")
+
+    def upsert(self, df, keys, texts, embeddings):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        keys = np.asarray(keys, dtype=np.int64)
+        if self.vectors is not None:
+            self.vectors.append(keys, embeddings)
+        if self.index is not None:
+            add_vectors(self.index, embeddings, keys)
+            return
+
+        self._pending.append((embeddings, keys))
+        self._pending_rows += len(keys)
+        if not needs_training(self.faiss_cfg) or self._pending_rows >= self.faiss_cfg.get("train_size", 100000):
+            self._create_from_pending()
+
+    def _create_from_pending(self):
+        embeddings = np.concatenate([e for e, _ in self._pending])
+        keys = np.concatenate([k for _, k in self._pending])
+        self._pending, self._pending_rows = [], 0
+        self.index = make_faiss_index(embeddings.shape[1], self.faiss_cfg, len(embeddings))
+        train_faiss_index(self.index, embeddings, self.faiss_cfg)
+        add_vectors(self.index, embeddings, keys)
+
+    def close(self):
+        if self._pending:
+            self._create_from_pending()
+        if self.vectors is not None:
+            self.vectors.close()
+        if self.index is None:
+            return
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        write_faiss_index(self.index, self.index_path)
+        print(f"🗂️ Saved FAISS index '{self.faiss_cfg.get('index_type', 'flat')}' with {self.index.ntotal} vectors")
+
+# ChromaDB backend
+class ChromaStoreWriter:
+    def __init__(self, config, incremental=False):
+        persist_dir = config["vector_store"]["persist_directory"]
+        collection_name = config["vector_store"]["collection_name_chroma"]
+        self.logical_batch_size = config["vector_store"].get("chroma_batch_size", 100000)
+        print("🧠 Logical batch size:", self.logical_batch_size)
+
+        # Create directory if it doesn't exist
+        os.makedirs(persist_dir, exist_ok=True)
+        client = chromadb.PersistentClient(path=persist_dir)
+
+        # A full build starts from an empty collection
+        if not incremental:
+            try:
+                client.delete_collection(name=collection_name)
+            except Exception:
+                pass  # nothing to clear yet
+        self.collection = client.get_or_create_collection(name=collection_name)
+        self.persist_dir = persist_dir
+
+    def delete(self, keys):
+        ids = [f"id_{k}" for k in keys]
+        for j in range(0, len(ids), CHROMA_MAX_BATCH):
+            self.collection.delete(ids=ids[j:j + CHROMA_MAX_BATCH])
+        if ids:
+            print(f"🗑️ Removed {len(ids)} items from ChromaDB")
+
+    def upsert(self, df, keys, texts, embeddings):
+        ids = [f"id_{k}" for k in keys]
+        metadatas = df.to_dict("records")
+
+        # Step through logical batch size
+        for i in range(0, len(texts), self.logical_batch_size):
+            batch_end = i + self.logical_batch_size
+
+            # Sub-batch to fit ChromaDB's max limit
+            for j in range(i, min(batch_end, len(texts)), CHROMA_MAX_BATCH):
+                sub_end = min(j + CHROMA_MAX_BATCH, batch_end)
+                self.collection.upsert(
+                    documents=texts[j:sub_end],
+                    embeddings=embeddings[j:sub_end].tolist(),
+                    ids=ids[j:sub_end],
+                    metadatas=metadatas[j:sub_end]
+                )
+
+            print(f"✅ Uploaded logical batch {i}-{min(batch_end, len(texts))}")
+
+    def close(self):
+        print(f"✅ Collection at '{self.persist_dir}' contains {self.collection.count()} documents")
+
+# Pinecone backend
+class PineconeStoreWriter:
+    def __init__(self, config, incremental=False):
+        # Get secrets from environment
+        api_key = os.getenv("PINECONE_API_KEY")
+        environment = os.getenv("PINECONE_ENVIRONMENT")
+
+        # Config values
+        index_name = config["vector_store"]["index_name"]
+        self.namespace = config["vector_store"]["namespace"]
+        self.batch_size = config["vector_store"]["batch_size"]
+
+        if not api_key:
+            raise ValueError("Missing PINECONE_API_KEY .env")
+
+        # Initialize Pinecone client
+        pc = Pinecone(api_key=api_key)
+
+        # Create index if it doesn't exist
+        if index_name not in pc.list_indexes().names():
+            pc.create_index(
+                name=index_name,
+                dimension=config["vector_store"]["dimension"],
+                metric=config["vector_store"]["metric"],
+                spec=ServerlessSpec(
+                    cloud="aws",
+                    region=environment
+                )
+            )
+            print(f"✅ Created Pinecone index: {index_name}")
+        elif not incremental:
+            try:
+                pc.Index(index_name).delete(delete_all=True, namespace=self.namespace)
+            except Exception as e:
+                print(f"[WARN] Could not clear namespace '{self.namespace}': {e}")
+
+        # Connect to the index
+        self.index = pc.Index(index_name)
+        self.index_name = index_name
+        self.uploaded = 0
+
+    def delete(self, keys):
+        ids = [f"id-{k}" for k in keys]
+        for i in range(0, len(ids), self.batch_size):
+            self.index.delete(ids=ids[i:i + self.batch_size], namespace=self.namespace)
+        if ids:
+            print(f"🗑️ Removed {len(ids)} vectors from Pinecone")
+
+    def upsert(self, df, keys, texts, embeddings):
+        # Prepare and upload vectors
+        vectors = [
+            (f"id-{k}", embedding.tolist(), {"text": text})
+            for k, text, embedding in zip(keys, texts, embeddings)
+        ]
+        for i in range(0, len(vectors), self.batch_size):
+            self.index.upsert(vectors=vectors[i:i + self.batch_size], namespace=self.namespace)
+        self.uploaded += len(vectors)
+
+    def close(self):
+        print(f"Uploaded {self.uploaded} vectors to Pinecone index '{self.index_name}' in namespace '{self.namespace}'")
+
+# the SQL-skeleton index is a second store of the same type under its own path/collection/namespace
+def sql_index_config(config):
+    sql_cfg = config["vector_store"].get("sql_index", {})
+    derived = copy.deepcopy(config)
+    for key in ("path_to_save", "collection_name_chroma", "namespace"):
+        if key in sql_cfg:
+            derived["vector_store"][key] = sql_cfg[key]
+    return derived
+
+STORE_WRITERS = {
+    "faiss": FaissStoreWriter,
+    "chromadb": ChromaStoreWriter,
+    "pinecone": PineconeStoreWriter
+}
+
+# work out which rows of a chunk to re-embed and which old vectors they replace
+def diff_chunk(old_rows, keys, hashes):
+    changed = np.array([old_rows.get(str(k)) != h for k, h in zip(keys, hashes)], dtype=bool)
+    stale = [int(k) for k, c in zip(keys, changed) if c and str(k) in old_rows]
+    return changed, stale
+
+def can_build_incrementally(config, manifest):
+    if manifest is None:
+        print("ℹ️ No build manifest found, running a full build")
+        return False
+    if {k: manifest.get(k) for k in manifest_header(config)} != manifest_header(config):
+        print("ℹ️ Store, embedding model or index type changed, running a full build")
+        return False
+    if config["vector_store"]["type"].lower() == "faiss" and get_faiss_config(config).get("index_type", "flat") == "hnsw":
+        print("ℹ️ HNSW indexes cannot remove vectors, running a full build")
+        return False
+    return True
+
+# core controller: read, embed and write one chunk at a time
+def build_vector_store(config_path, incremental=False):
     config = read_param(config_path)
-
-    df = pd.read_csv(config["data"]["loc"])
-    texts = df["sql_prompt"].tolist()
-
-    model_name = config["embedding_model"]
-    embeddings = get_embeddings(texts, model_name)
-
     store_type = config["vector_store"]["type"].lower()
-
-    if store_type == "faiss":
-        build_faiss_index(df,texts, embeddings, config)
-    elif store_type == "chromadb":
-        build_chromedb_index(df,texts, embeddings, config)
-    elif store_type == "pinecone":
-        build_pinecone_index(df,texts,embeddings, config)
-    else:
+    if store_type not in STORE_WRITERS:
         raise ValueError(f"Unsupported vector store type: {store_type}")
 
+    manifest_path = config["vector_store"]["manifest_path"]
+    manifest = load_manifest(manifest_path)
+    incremental = incremental and can_build_incrementally(config, manifest)
+    old_rows = manifest["rows"] if incremental else {}
+
+    writer = STORE_WRITERS[store_type](config, incremental=incremental)
+    sql_cfg = config["vector_store"].get("sql_index", {})
+    sql_writer = STORE_WRITERS[store_type](sql_index_config(config), incremental=incremental) if sql_cfg.get("enable", False) else None
+    embedder = get_embedding_service(config)
+    embedder.start_pool(config.get("build", {}).get("workers", 1))
+
+    # the lexical index is cheap, so it is always rebuilt from every row
+    lexical_cfg = config.get("lexical", {})
+    lexical_writer = None
+    if lexical_cfg.get("enable", False):
+        lexical_writer = LexicalIndexWriter(lexical_cfg["path"], lexical_cfg.get("fields", ["sql_prompt", "sql"]))
+
+    all_keys, all_hashes, seen = [], [], set()
+    embedded = deleted = 0
+    try:
+        with MetadataStoreWriter(config["vector_store"]["metadata_path"]) as metadata_writer:
+            for chunk in iter_chunks(config):
+                keys = row_keys(chunk)
+                if seen.intersection(keys.tolist()):
+                    raise ValueError("Duplicate row ids across chunks; the 'id' column must be unique")
+                seen.update(keys.tolist())
+                hashes = row_hashes(chunk)
+
+                if incremental:
+                    changed, stale = diff_chunk(old_rows, keys, hashes)
+                    writer.delete(stale)
+                    if sql_writer is not None:
+                        sql_writer.delete(stale)
+                    deleted += len(stale)
+                    to_embed, embed_keys = chunk[changed], keys[changed]
+                else:
+                    to_embed, embed_keys = chunk, keys
+
+                if len(to_embed):
+                    texts = to_embed["sql_prompt"].tolist()
+                    writer.upsert(to_embed, embed_keys, texts, embedder.encode_chunk(texts))
+                    if sql_writer is not None:
+                        skeletons = [sql_skeleton(q) for q in to_embed[sql_cfg.get("field", "sql")].tolist()]
+                        sql_writer.upsert(to_embed, embed_keys, skeletons, embedder.encode_chunk(skeletons))
+                    embedded += len(to_embed)
+
+                metadata_writer.append(chunk, keys)
+                if lexical_writer is not None:
+                    lexical_writer.append(chunk, keys)
+                all_keys.extend(keys.tolist())
+                all_hashes.extend(hashes)
+                print(f"✅ Processed rows {int(chunk.index[0])}-{int(chunk.index[-1])} ({embedded} embedded so far)")
+
+        # rows that disappeared from the dataset
+        removed = [int(k) for k in old_rows if int(k) not in seen]
+        writer.delete(removed)
+        writer.close()
+        if sql_writer is not None:
+            sql_writer.delete(removed)
+            sql_writer.close()
+        if lexical_writer is not None:
+            lexical_writer.close()
+    finally:
+        embedder.stop_pool()
+
+    if incremental:
+        print(f"🔁 Incremental build: {embedded} new or changed rows, {deleted + len(removed)} deletions")
+    save_manifest(manifest_path, config, all_keys, all_hashes)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="params.yaml")
+    parser.add_argument("--incremental", action="store_true", help="only embed new or changed rows since the last build")
     parsed_args = parser.parse_args()
 
-    build_vector_store(config_path=parsed_args.config)
\ No newline at end of file
+    build_vector_store(config_path=parsed_args.config, incremental=parsed_args.incremental)
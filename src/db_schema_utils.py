@@ -2,6 +2,7 @@ import os
 import yaml
 import sqlalchemy
 from sqlalchemy import create_engine, text
+from concurrent.futures import ThreadPoolExecutor
 
 def read_db_config(path="db_config.yaml"):
     with open(path, "r") as f:
@@ -20,29 +21,153 @@ def create_connection(db_cfg):
         conn_str = f"mysql+pymysql://{db_cfg['user']}:{db_cfg['password']}@{db_cfg['host']}:{db_cfg['port']}/{db_cfg['name']}"
     elif db_cfg["type"] == "postgres":
         conn_str = f"postgresql://{db_cfg['user']}:{db_cfg['password']}@{db_cfg['host']}:{db_cfg['port']}/{db_cfg['name']}"
+    elif db_cfg["type"] == "sqlite":
+        # file-backed stand-in database for benchmarks and offline use; name is the path
+        return create_engine(f"sqlite:///{db_cfg['name']}")
     else:
         raise ValueError("Unsupported DB type")
-    return create_engine(conn_str)
-
-def extract_schema_with_examples(engine, db_name, sample_rows=2):
-    inspector = sqlalchemy.inspect(engine)
-    schema_strs = []
-    for table in inspector.get_table_names():
-        columns = inspector.get_columns(table)
-        col_str = ", ".join(f"{col['name']} ({col['type']})" for col in columns)
-        schema_strs.append(f"Table: {table}\nColumns: {col_str}")
-
-        try:
-            with engine.connect() as conn:                     # ← get a Connection
-                result = conn.execute(text(f"SELECT * FROM {table} LIMIT {sample_rows}"))
-                rows = result.fetchall()
-            if rows:
-                schema_strs.append("Sample rows:")
-                for row in rows:
-                    schema_strs.append(str(dict(row._mapping)))
-        except Exception as e:
-            schema_strs.append(f"(Could not fetch rows: {e})")
-
-        schema_strs.append("\n")
-
-    return "\n".join(schema_strs)
\ No newline at end of file
+    return create_engine(conn_str, pool_size=db_cfg.get("pool_size", 5), pool_pre_ping=True)
+
+# All columns of all base tables, with comments, in one round-trip
+COLUMN_QUERIES = {
+    "mysql": """SELECT c.table_name AS table_name, c.column_name AS column_name, c.column_type AS data_type,
+                       c.column_comment AS column_comment, t.table_comment AS table_comment
+                FROM information_schema.columns c
+                JOIN information_schema.tables t
+                  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+                WHERE c.table_schema = DATABASE() AND t.table_type = 'BASE TABLE'
+                ORDER BY c.table_name, c.ordinal_position""",
+    "postgresql": """SELECT c.table_name, c.column_name, c.data_type,
+                            pgd.description AS column_comment,
+                            obj_description(st.relid, 'pg_class') AS table_comment
+                     FROM information_schema.columns c
+                     JOIN information_schema.tables t
+                       ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+                     LEFT JOIN pg_catalog.pg_statio_all_tables st
+                       ON st.schemaname = c.table_schema AND st.relname = c.table_name
+                     LEFT JOIN pg_catalog.pg_description pgd
+                       ON pgd.objoid = st.relid AND pgd.objsubid = c.ordinal_position
+                     WHERE c.table_schema = current_schema() AND t.table_type = 'BASE TABLE'
+                     ORDER BY c.table_name, c.ordinal_position""",
+}
+
+# {table: {"columns": [(name, type, comment)], "comment": str}}
+def fetch_columns(engine):
+    query = COLUMN_QUERIES.get(engine.dialect.name)
+    if query is None:
+        # other dialects: fall back to per-table reflection
+        inspector = sqlalchemy.inspect(engine)
+        return {
+            table: {
+                "columns": [(col["name"], str(col["type"]), col.get("comment") or "") for col in inspector.get_columns(table)],
+                "comment": ""
+            }
+            for table in inspector.get_table_names()
+        }
+
+    tables = {}
+    with engine.connect() as conn:
+        for table, column, data_type, column_comment, table_comment in conn.execute(text(query)):
+            entry = tables.setdefault(table, {"columns": [], "comment": table_comment or ""})
+            entry["columns"].append((column, str(data_type).upper(), column_comment or ""))
+    return tables
+
+def _sample_query(engine, table, sample_rows):
+    quoted = engine.dialect.identifier_preparer.quote(table)
+    return text(f"SELECT * FROM {quoted} LIMIT {int(sample_rows)}")
+
+def _fetch_sample(conn, engine, table, sample_rows):
+    try:
+        rows = conn.execute(_sample_query(engine, table, sample_rows)).fetchall()
+        # rendered up front so snapshots stay JSON-serializable
+        return [str(dict(row._mapping)) for row in rows], None
+    except Exception as e:
+        conn.rollback()  # keep the connection usable after a failed read
+        return [], e
+
+# Sample rows over one connection, or a bounded pool of them when workers > 1
+def fetch_sample_rows(engine, tables, sample_rows, workers=4):
+    if sample_rows <= 0:
+        return {table: ([], None) for table in tables}
+
+    if workers <= 1:
+        with engine.connect() as conn:
+            return {table: _fetch_sample(conn, engine, table, sample_rows) for table in tables}
+
+    def sample(table):
+        with engine.connect() as conn:
+            return _fetch_sample(conn, engine, table, sample_rows)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(tables, pool.map(sample, tables)))
+
+def extract_schema_tables(engine, sample_rows=2, workers=4):
+    columns = fetch_columns(engine)
+    samples = fetch_sample_rows(engine, list(columns), sample_rows, workers)
+    return [
+        {
+            "name": table,
+            "comment": info["comment"],
+            "columns": info["columns"],
+            "sample_rows": samples[table][0],
+            "error": str(samples[table][1]) if samples[table][1] else None
+        }
+        for table, info in columns.items()
+    ]
+
+def format_table(table):
+    col_str = ", ".join(f"{name} ({col_type})" for name, col_type, *_ in table["columns"])
+    lines = [f"Table: {table['name']}\nColumns: {col_str}"]
+    if table.get("comment"):
+        lines.append(f"Comment: {table['comment']}")
+    if table["error"]:
+        lines.append(f"(Could not fetch rows: {table['error']})")
+    elif table["sample_rows"]:
+        lines.append("Sample rows:")
+        lines.extend(table["sample_rows"])
+    lines.append("\n")
+    return "\n".join(lines)
+
+def format_schema(tables):
+    return "\n".join(format_table(table) for table in tables)
+
+def extract_schema_with_examples(engine, db_name, sample_rows=2, workers=4):
+    return format_schema(extract_schema_tables(engine, sample_rows, workers))
+
+# Cheap fingerprint of the schema, used to tell when a cached snapshot is stale
+CHANGE_MARKER_QUERIES = {
+    "mysql": [
+        """SELECT COUNT(DISTINCT table_name) AS table_count,
+                  COUNT(*) AS column_count,
+                  SUM(CRC32(CONCAT(table_name, '.', column_name, ':', column_type))) AS column_checksum
+           FROM information_schema.columns
+           WHERE table_schema = DATABASE()""",
+        """SELECT MAX(create_time) AS last_ddl
+           FROM information_schema.tables
+           WHERE table_schema = DATABASE()""",
+    ],
+    "postgres": [
+        """SELECT COUNT(DISTINCT table_name) AS table_count,
+                  COUNT(*) AS column_count,
+                  md5(string_agg(table_name || '.' || column_name || ':' || data_type, ','
+                                 ORDER BY table_name, ordinal_position)) AS column_checksum
+           FROM information_schema.columns
+           WHERE table_schema = current_schema()""",
+    ],
+    "sqlite": [
+        """SELECT COUNT(*) AS table_count, group_concat(sql, ';') AS ddl
+           FROM sqlite_master
+           WHERE type = 'table'""",
+    ],
+}
+
+def read_change_markers(engine, db_type):
+    queries = CHANGE_MARKER_QUERIES.get(db_type)
+    if not queries:
+        return None
+    markers = {}
+    with engine.connect() as conn:
+        for query in queries:
+            row = conn.execute(text(query)).mappings().first()
+            markers.update({k: str(v) for k, v in row.items()})
+    return markers
\ No newline at end of file
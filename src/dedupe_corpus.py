@@ -0,0 +1,172 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import argparse
+import hashlib
+import json
+import zlib
+import numpy as np
+import pandas as pd
+import yaml
+from sql_normalize import SKELETON_VERSION, sql_skeleton
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+# Skeletons already strip literals, space out operators, squeeze whitespace,
+# lower-case and collapse IN-lists to ( ? ), which makes literal order
+# irrelevant as well
+def canonical_sql(sql):
+    return sql_skeleton(sql)
+
+def shingles(text, size=3):
+    tokens = text.split()
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+class MinHasher:
+    """Deterministic MinHash over token shingles (crc32, fixed-seed permutations)."""
+
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def signature(self, text):
+        hashed = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)), dtype=np.uint64
+        )
+        return ((self.a[:, None] * hashed[None, :] + self.b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+class MinHashLSH:
+    """
+    Banded LSH over MinHash signatures: items sharing any band are candidates,
+    and a candidate is a duplicate when the estimated Jaccard similarity
+    reaches the threshold.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.9):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.threshold = threshold
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, signature):
+        for band, key in enumerate(self._band_keys(signature)):
+            for item in self._buckets[band].get(key, ()):
+                if np.mean(self._signatures[item] == signature) >= self.threshold:
+                    return item
+        return None
+
+    def insert(self, item, signature):
+        self._signatures[item] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(item)
+
+def dedupe_config(config):
+    return config["data"].get("dedupe", {})
+
+# Written next to the deduplicated CSV: the settings and normalizer it was built with
+def meta_path(out_path):
+    return f"{out_path}.meta.json"
+
+def dedupe_fingerprint(config):
+    dd_cfg = {k: v for k, v in dedupe_config(config).items() if k not in ("enable", "path")}
+    payload = json.dumps({"source": config["data"]["loc"], "dedupe": dd_cfg, "skeleton": SKELETON_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def is_stale(config, out_path):
+    if not os.path.exists(out_path) or os.path.getmtime(out_path) < os.path.getmtime(config["data"]["loc"]):
+        return True
+    try:
+        with open(meta_path(out_path)) as f:
+            return json.load(f).get("fingerprint") != dedupe_fingerprint(config)
+    except (OSError, ValueError):
+        return True
+
+# The corpus the index is built from: the deduplicated CSV when enabled, refreshed
+# when the raw CSV is newer or the dedupe settings or normalizer changed
+def corpus_path(config):
+    dd_cfg = dedupe_config(config)
+    if not dd_cfg.get("enable", False):
+        return config["data"]["loc"]
+    out_path = dd_cfg["path"]
+    if is_stale(config, out_path):
+        dedupe_corpus(config)
+    return out_path
+
+def dedupe_corpus(config):
+    """
+    Two streaming passes over data.loc. The first assigns each row to a
+    cluster: exact matches on the canonical SQL, then MinHash LSH for
+    near-duplicates. The second writes the first row of every cluster with
+    a frequency column holding the cluster size.
+    """
+    dd_cfg = dedupe_config(config)
+    field = dd_cfg.get("field", "sql")
+    chunk_size = config.get("build", {}).get("chunk_size", 10000)
+    num_perm = dd_cfg.get("num_perm", 64)
+    hasher = MinHasher(num_perm, dd_cfg.get("shingle_size", 3))
+    lsh = MinHashLSH(num_perm, dd_cfg.get("bands", 16), dd_cfg.get("threshold", 0.9))
+
+    exact = {}             # canonical SQL -> representative row
+    representative = []    # per row: row number of its cluster's representative
+    frequency = {}
+    near = 0
+
+    for chunk in pd.read_csv(config["data"]["loc"], chunksize=chunk_size):
+        for sql in chunk[field].tolist():
+            row = len(representative)
+            canonical = canonical_sql(sql)
+            rep = exact.get(canonical)
+            if rep is None and canonical:
+                signature = hasher.signature(canonical)
+                rep = lsh.query(signature)
+                if rep is None:
+                    lsh.insert(row, signature)
+                else:
+                    near += 1
+                exact[canonical] = row if rep is None else rep
+            rep = row if rep is None else rep
+            representative.append(rep)
+            frequency[rep] = frequency.get(rep, 0) + 1
+
+    out_path = dd_cfg["path"]
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    representative = np.asarray(representative, dtype=np.int64)
+    offset, kept = 0, 0
+    for i, chunk in enumerate(pd.read_csv(config["data"]["loc"], chunksize=chunk_size)):
+        rows = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        keep = representative[rows] == rows
+        out = chunk[keep].copy()
+        out["frequency"] = [frequency[r] for r in rows[keep]]
+        out.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        kept += len(out)
+    os.replace(tmp_path, out_path)
+    with open(f"{meta_path(out_path)}.tmp", "w") as f:
+        json.dump({"fingerprint": dedupe_fingerprint(config), "rows": offset, "kept": kept}, f)
+    os.replace(f"{meta_path(out_path)}.tmp", meta_path(out_path))
+
+    print(f"🧹 Deduplicated {offset} rows to {kept} ({offset - kept} duplicates, {near} found by MinHash) → {out_path}")
+    return out_path
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--config", default="params.yaml")
+    parsed_args = args.parse_args()
+    dedupe_corpus(read_param(parsed_args.config))
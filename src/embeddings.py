@@ -0,0 +1,111 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+BACKENDS = ("torch", "onnx")
+
+# Collapse whitespace and case so near-identical clipboard captures share a key
+def normalize_fragment(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+# torch and sentence-transformers are only imported when the torch backend is used
+def load_encoder(model_name, backend="torch", onnx_cfg=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    if backend == "onnx":
+        from onnx_encoder import OnnxEncoder, is_onnx_encoder
+        onnx_cfg = onnx_cfg or {}
+        model_dir = onnx_cfg.get("path", f"models/onnx/{model_name}")
+        quantized = onnx_cfg.get("quantized", False)
+        if is_onnx_encoder(model_dir, quantized):
+            return OnnxEncoder(model_dir, quantized=quantized, threads=onnx_cfg.get("threads", 0))
+        print(f"[WARN] No ONNX export at {model_dir}—falling back to PyTorch. Run src/export_onnx_encoder.py first.")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+class EmbeddingService:
+    """
+    Loads the sentence-transformer once per process and serves batch encodes,
+    with a bounded LRU of query embeddings keyed by the normalized fragment.
+    The model runs on PyTorch or, exported, on ONNX Runtime.
+    """
+
+    def __init__(self, model_name, cache_size=1024, batch_size=64, backend="torch", onnx_cfg=None):
+        print(f"Loading embedding model: {model_name} ({backend})")
+        self.model_name = model_name
+        self.model = load_encoder(model_name, backend, onnx_cfg)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def encode(self, texts, show_progress_bar=False):
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=show_progress_bar
+        )
+
+    # multi-process CPU pool for bulk encoding during builds
+    def start_pool(self, workers):
+        if not hasattr(self.model, "start_multi_process_pool"):
+            return  # ONNX Runtime already spreads one forward pass over the cores
+        if workers > 1 and self._pool is None:
+            print(f"🧵 Starting {workers} encoder processes")
+            self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * workers)
+
+    def stop_pool(self):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def encode_chunk(self, texts):
+        if self._pool is None:
+            return self.encode(texts)
+        return self.model.encode_multi_process(texts, self._pool, batch_size=self.batch_size)
+
+    def encode_queries(self, queries):
+        keys = [normalize_fragment(q) for q in queries]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[key] = self._cache[key]
+
+        misses = list(dict.fromkeys(k for k in keys if k not in vectors))
+        if misses:
+            encoded = self.encode(misses)
+            with self._lock:
+                for key, vector in zip(misses, encoded):
+                    vectors[key] = vector
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return np.stack([vectors[k] for k in keys])
+
+    def encode_query(self, query):
+        return self.encode_queries([query])
+
+# one warm service per model name and backend
+_services = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(config):
+    model_name = config["embedding_model"]
+    embed_cfg = config.get("embedding", {})
+    backend = embed_cfg.get("backend", "torch")
+    with _services_lock:
+        if (model_name, backend) not in _services:
+            _services[(model_name, backend)] = EmbeddingService(
+                model_name,
+                cache_size=embed_cfg.get("cache_size", 1024),
+                batch_size=embed_cfg.get("batch_size", 64),
+                backend=backend,
+                onnx_cfg=embed_cfg.get("onnx")
+            )
+        return _services[(model_name, backend)]
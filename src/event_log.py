@@ -0,0 +1,234 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import argparse
+import atexit
+import csv
+import datetime
+import glob
+import json
+import queue
+import threading
+import time
+import yaml
+from collections import defaultdict
+import numpy as np
+from timing import PERCENTILES
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".ndjson"
+
+def segment_name(ts, seq):
+    # start time in epoch ms first so names sort in time order
+    return f"{SEGMENT_PREFIX}{int(ts * 1000):013d}-{seq:04d}{SEGMENT_SUFFIX}"
+
+def segment_start(path):
+    return int(os.path.basename(path)[len(SEGMENT_PREFIX):].split("-")[0]) / 1000
+
+def list_segments(directory):
+    return sorted(glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")))
+
+def to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return datetime.datetime.fromisoformat(str(value)).timestamp()
+
+class EventLog:
+    """
+    Append-only suggestion log as newline-delimited JSON segments.
+
+    append() only enqueues; a background thread writes batches every
+    flush_interval_s and starts a new segment once the current one passes
+    max_segment_bytes. Segment names carry their first timestamp so readers
+    can skip whole files outside a time range.
+    """
+
+    def __init__(self, directory, max_segment_bytes=16 * 1024 * 1024, flush_interval_s=1.0, resume=True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue()
+        self._file = None
+        self._seq = 0
+        self._closed = threading.Event()
+
+        # keep appending to the newest segment if it still has room
+        segments = list_segments(directory)
+        if resume and segments and os.path.getsize(segments[-1]) < max_segment_bytes:
+            self._file = open(segments[-1], "a", encoding="utf-8")
+
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def append(self, event):
+        self._queue.put({"ts": time.time(), **event})
+
+    def _rotate(self, ts):
+        if self._file is not None:
+            self._file.close()
+        self._seq += 1
+        self._file = open(os.path.join(self.directory, segment_name(ts, self._seq)), "a", encoding="utf-8")
+
+    def _write(self, events):
+        for event in events:
+            if self._file is None or self._file.tell() >= self.max_segment_bytes:
+                self._rotate(event["ts"])
+            self._file.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._closed.wait(self.flush_interval_s)
+            events = self._drain()
+            if events:
+                try:
+                    self._write(events)
+                except Exception as e:
+                    print(f"[ERROR] Failed to write {len(events)} log events: {e}")
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._writer.join()
+        events = self._drain()
+        if events:
+            self._write(events)
+        if self._file is not None:
+            self._file.close()
+
+class EventLogReader:
+    """Streams events from the segments of an EventLog, optionally within [start, end)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self, start=None, end=None):
+        start, end = to_epoch(start), to_epoch(end)
+        segments = list_segments(self.directory)
+        selected = []
+        for i, path in enumerate(segments):
+            # a segment ends where the next one begins (names are floored to the millisecond)
+            next_start = segment_start(segments[i + 1]) + 0.001 if i + 1 < len(segments) else None
+            if end is not None and segment_start(path) >= end:
+                break
+            if start is not None and next_start is not None and next_start <= start:
+                continue
+            selected.append(path)
+        return selected
+
+    def iter_events(self, start=None, end=None):
+        start, end = to_epoch(start), to_epoch(end)
+        for path in self.segments(start, end):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from a crash
+                    ts = event.get("ts", 0)
+                    if (start is None or ts >= start) and (end is None or ts < end):
+                        yield event
+
+    # Resume after a saved (segment name, byte offset); only complete lines are consumed
+    def iter_from(self, position=None):
+        last_segment, last_offset = position or (None, 0)
+        for path in list_segments(self.directory):
+            name = os.path.basename(path)
+            if last_segment is not None and name < last_segment:
+                continue
+            offset = last_offset if name == last_segment else 0
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for line in iter(f.readline, b""):
+                    if not line.endswith(b"\n"):
+                        break  # still being written
+                    offset += len(line)
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        event = None
+                    yield event, (name, offset)
+
+    # Per-group counts and latency percentiles in one pass, without building a frame
+    def aggregate(self, start=None, end=None, group_by="model"):
+        groups = defaultdict(lambda: {"total": 0, "statuses": defaultdict(int), "timings": defaultdict(list), "last": {}})
+        for event in self.iter_events(start, end):
+            group = groups[event.get(group_by, "N/A")]
+            group["total"] += 1
+            group["statuses"][event.get("status")] += 1
+            group["last"] = event
+            for key, value in event.items():
+                if key.endswith("_ms") and value is not None:
+                    group["timings"][key].append(float(value))
+
+        summary = {}
+        for name, group in groups.items():
+            total = group["total"]
+            accepted = group["statuses"]["ACCEPTED"]
+            rejected = group["statuses"]["DISMISSED"]
+            latency = np.asarray(group["timings"].get("latency_ms", []), dtype=np.float64)
+            summary[name] = {
+                "embedding_model": group["last"].get("embedding_model", "N/A"),
+                "vector_store": group["last"].get("vector_store", "N/A"),
+                "acceptance_rate": accepted / total if total else 0,
+                "rejection_rate": rejected / total if total else 0,
+                "accepted_count": accepted,
+                "rejected_count": rejected,
+                "total_count": total,
+                "avg_latency_ms": float(latency.mean()) if latency.size else None,
+                "min_latency_ms": float(latency.min()) if latency.size else None,
+                "max_latency_ms": float(latency.max()) if latency.size else None,
+                "percentiles": {
+                    key: {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+                    for key, values in sorted(group["timings"].items())
+                }
+            }
+        return summary
+
+# Backfill the event log from a suggestions_log.csv written by older versions;
+# the rows go to fresh segments named after their own timestamps
+def import_csv(csv_path, directory):
+    log = EventLog(directory, resume=False)
+    count = 0
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            ts = datetime.datetime.strptime(row.pop("timestamp"), "%Y-%m-%d %H:%M:%S").timestamp()
+            event = {k: v.replace("\\n", "\n") for k, v in row.items() if v not in ("", None)}
+            for key in [k for k in event if k.endswith("_ms")]:
+                event[key] = float(event[key])
+            log._queue.put({"ts": ts, **event})
+            count += 1
+    log.close()
+    return count
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--config", default="params.yaml")
+    args.add_argument("--import-csv", default=None, help="backfill from an old suggestions_log.csv")
+    args.add_argument("--since", default=None, help="ISO timestamp, e.g. 2024-01-01T00:00")
+    args.add_argument("--until", default=None)
+    parsed_args = args.parse_args()
+
+    log_dir = read_param(parsed_args.config).get("event_log", {}).get("dir", "logs/events")
+    if parsed_args.import_csv:
+        print(f"📥 Imported {import_csv(parsed_args.import_csv, log_dir)} rows into {log_dir}")
+    else:
+        print(json.dumps(EventLogReader(log_dir).aggregate(parsed_args.since, parsed_args.until), indent=2))
@@ -0,0 +1,190 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import argparse
+import json
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+import yaml
+from onnx_encoder import ENCODER_FILE, OnnxEncoder, onnx_model_file
+from timing import PERCENTILES
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+def onnx_config(config):
+    onnx_cfg = config.get("embedding", {}).get("onnx", {})
+    return {**onnx_cfg, "path": onnx_cfg.get("path", f"models/onnx/{config['embedding_model']}")}
+
+def export_onnx(model, model_name, model_dir, opset=14):
+    """Export the sentence-transformer's transformer to ONNX, with the tokenizer and pooling settings."""
+    import torch
+
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = model[1].get_pooling_mode_str()
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling}")
+
+    # the wrapper returns the token embeddings only, so the graph has a single output
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    sample = tokenizer(["SELECT name FROM customers WHERE"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    os.makedirs(model_dir, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            tuple(sample[name] for name in input_names),
+            onnx_model_file(model_dir, quantized=False),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "token_embeddings": {0: "batch", 1: "sequence"}
+            },
+            opset_version=opset
+        )
+    tokenizer.save_pretrained(model_dir)
+
+    meta = {
+        "model_name": model_name,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "pooling": pooling,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token
+    }
+    with open(os.path.join(model_dir, ENCODER_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"📦 Exported ONNX encoder to {model_dir}")
+    return meta
+
+# int8 weights, float activations: no calibration data needed
+def quantize_onnx(model_dir):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        onnx_model_file(model_dir, quantized=False),
+        onnx_model_file(model_dir, quantized=True),
+        weight_type=QuantType.QInt8
+    )
+    sizes = [os.path.getsize(onnx_model_file(model_dir, q)) / 2**20 for q in (False, True)]
+    print(f"🗜️ Quantized ONNX encoder: {sizes[0]:.1f} MB → {sizes[1]:.1f} MB")
+
+def cosine_parity(reference, candidate):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (reference * candidate).sum(axis=1)
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+# one query at a time, like the hotkey path
+def single_query_latency(encode, queries, warmup=5):
+    for q in queries[:warmup]:
+        encode([q])
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        encode([q])
+        samples.append((time.perf_counter() - start) * 1000)
+    return {f"p{p}": round(float(np.percentile(samples, p)), 3) for p in PERCENTILES}
+
+# cold import of each backend in a fresh interpreter
+def import_ms(statement):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def sample_texts(config, size, seed=0):
+    df = pd.read_csv(config["data"]["loc"], usecols=["sql_prompt", "sql"])
+    df = df.sample(n=min(size, len(df)), random_state=seed)
+    # the assistant embeds both prompts and partial SQL
+    return df["sql_prompt"].astype(str).tolist() + df["sql"].astype(str).tolist()
+
+def export_and_check(config_path, quantize=True, num_texts=200, skip_export=False, output="reports/onnx_encoder_report.json"):
+    from sentence_transformers import SentenceTransformer
+
+    config = read_param(config_path)
+    onnx_cfg = onnx_config(config)
+    model_dir = onnx_cfg["path"]
+    threads = onnx_cfg.get("threads", 0)
+    min_cosine = onnx_cfg.get("parity_min_cosine", 0.98)
+
+    model = SentenceTransformer(config["embedding_model"])
+    if not skip_export:
+        export_onnx(model, config["embedding_model"], model_dir, onnx_cfg.get("opset", 14))
+        if quantize:
+            quantize_onnx(model_dir)
+
+    texts = sample_texts(config, num_texts)
+    batch_size = config.get("embedding", {}).get("batch_size", 64)
+    reference = model.encode(texts, batch_size=batch_size)
+
+    report = {
+        "embedding_model": config["embedding_model"],
+        "num_texts": len(texts),
+        "import_ms": {
+            "torch": import_ms("import sentence_transformers"),
+            "onnx": import_ms("import onnx_encoder")
+        },
+        "backends": {
+            "torch": {"single_query_ms": single_query_latency(model.encode, texts)}
+        }
+    }
+
+    failed = []
+    variants = [("onnx", False)] + ([("onnx_int8", True)] if os.path.exists(onnx_model_file(model_dir, True)) else [])
+    for name, quantized in variants:
+        encoder = OnnxEncoder(model_dir, quantized=quantized, threads=threads)
+        parity = cosine_parity(reference, encoder.encode(texts, batch_size=batch_size))
+        report["backends"][name] = {
+            "parity": parity,
+            "single_query_ms": single_query_latency(encoder.encode, texts)
+        }
+        if parity["min_cosine"] < min_cosine:
+            failed.append(name)
+
+    for name, result in report["backends"].items():
+        latency = result["single_query_ms"]
+        parity = result.get("parity")
+        parity_text = f"  min/mean cosine {parity['min_cosine']:.4f}/{parity['mean_cosine']:.4f}" if parity else ""
+        print(f"{name:<10} p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms{parity_text}")
+    print(f"Import: torch {report['import_ms']['torch']} ms, onnx {report['import_ms']['onnx']} ms")
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Report saved to {output}")
+
+    if failed:
+        print(f"[ERROR] {', '.join(failed)} below parity threshold {min_cosine}—keep embedding.backend: torch")
+    return report, not failed
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Export the embedding model to ONNX and compare it with PyTorch")
+    args.add_argument("--config", default="params.yaml")
+    args.add_argument("--no-quantize", action="store_true", help="skip the int8 model")
+    args.add_argument("--skip-export", action="store_true", help="only rerun the parity and latency checks")
+    args.add_argument("--num-texts", type=int, default=200)
+    args.add_argument("--output", default="reports/onnx_encoder_report.json")
+    parsed_args = args.parse_args()
+
+    _, passed = export_and_check(
+        parsed_args.config,
+        quantize=not parsed_args.no_quantize,
+        num_texts=parsed_args.num_texts,
+        skip_export=parsed_args.skip_export,
+        output=parsed_args.output
+    )
+    sys.exit(0 if passed else 1)
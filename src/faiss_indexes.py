@@ -0,0 +1,124 @@
+import os
+import faiss
+import numpy as np
+
+# factory strings for the supported FAISS index types
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "binary")
+
+# compact codes that are re-ranked with the full-precision vectors by default
+COMPRESSED_TYPES = ("sq8", "binary")
+
+def get_faiss_config(config):
+    return config["vector_store"].get("faiss", {})
+
+def index_type_of(faiss_cfg):
+    return faiss_cfg.get("index_type", "flat").lower()
+
+def is_binary(faiss_cfg):
+    return index_type_of(faiss_cfg) == "binary"
+
+def uses_rerank(faiss_cfg):
+    return index_type_of(faiss_cfg) in COMPRESSED_TYPES and faiss_cfg.get("rerank", True)
+
+# one bit per dimension: 384 floats become 48 bytes
+def binarize(vectors):
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+# IVF needs roughly 39 training points per cell, so shrink nlist on small corpora
+def effective_nlist(faiss_cfg, num_vectors):
+    return max(1, min(faiss_cfg.get("nlist", 1024), num_vectors // 39))
+
+# flat and HNSW get an IDMap2 so vectors are addressed by row key; IVF maps ids natively
+def factory_string(faiss_cfg, num_vectors):
+    index_type = index_type_of(faiss_cfg)
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{effective_nlist(faiss_cfg, num_vectors)},Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{faiss_cfg.get('hnsw_m', 32)},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{effective_nlist(faiss_cfg, num_vectors)},PQ{faiss_cfg.get('pq_m', 48)}x{faiss_cfg.get('nbits', 8)}"
+    if index_type == "sq8":
+        return "IDMap2,SQ8"
+    raise ValueError(f"Unsupported FAISS index type: {index_type}")
+
+def make_faiss_index(dim, faiss_cfg, num_vectors):
+    if is_binary(faiss_cfg):
+        # Hamming-distance scan over sign bits
+        return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dim))
+    index = faiss.index_factory(dim, factory_string(faiss_cfg, num_vectors), faiss.METRIC_L2)
+    base = base_index(index)
+    if hasattr(base, "hnsw"):
+        base.hnsw.efConstruction = faiss_cfg.get("ef_construction", 200)
+    return index
+
+# the index underneath an IDMap wrapper
+def base_index(index):
+    return faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+
+def needs_training(faiss_cfg):
+    return index_type_of(faiss_cfg) in ("ivf_flat", "ivf_pq", "sq8")
+
+def train_faiss_index(index, embeddings, faiss_cfg):
+    if index.is_trained:
+        return
+    train_size = min(faiss_cfg.get("train_size", 100000), len(embeddings))
+    sample = np.random.default_rng(0).choice(len(embeddings), train_size, replace=False)
+    print(f"🏋️ Training FAISS index on {train_size} vectors")
+    index.train(np.ascontiguousarray(embeddings[np.sort(sample)], dtype=np.float32))
+
+# build, train and fill an index in one go
+def build_trained_index(embeddings, faiss_cfg, ids=None):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if ids is None:
+        ids = np.arange(len(embeddings))
+    index = make_faiss_index(embeddings.shape[1], faiss_cfg, len(embeddings))
+    train_faiss_index(index, embeddings, faiss_cfg)
+    add_vectors(index, embeddings, ids)
+    return index
+
+# float and binary indexes take the same float32 input
+def add_vectors(index, embeddings, ids):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if isinstance(index, faiss.IndexBinary):
+        embeddings = binarize(embeddings)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+
+def search_index(index, query_vectors, k):
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    if isinstance(index, faiss.IndexBinary):
+        query_vectors = binarize(query_vectors)
+    return index.search(query_vectors, k)
+
+def read_faiss_index(path, faiss_cfg):
+    return faiss.read_index_binary(path) if is_binary(faiss_cfg) else faiss.read_index(path)
+
+# written next to the live file and renamed over it, so a reader never loads half an index
+def write_faiss_index(index, path):
+    tmp_path = f"{path}.tmp"
+    if isinstance(index, faiss.IndexBinary):
+        faiss.write_index_binary(index, tmp_path)
+    else:
+        faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+# changes whenever a build replaces the index file
+def index_file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+# apply query-time knobs (nprobe / efSearch) to a loaded index
+def set_query_params(index, faiss_cfg, nprobe=None, ef_search=None):
+    if isinstance(index, faiss.IndexBinary):
+        return  # exhaustive Hamming scan, nothing to tune
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe or faiss_cfg.get("nprobe", 16)
+    except RuntimeError:
+        pass  # not an IVF index
+    base = base_index(index)
+    if hasattr(base, "hnsw"):
+        base.hnsw.efSearch = ef_search or faiss_cfg.get("ef_search", 64)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import time
+import faiss
+import numpy as np
+import pandas as pd
+import yaml
+from embeddings import get_embedding_service
+from faiss_indexes import INDEX_TYPES, COMPRESSED_TYPES, base_index, build_trained_index, get_faiss_config, search_index, set_query_params
+
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128]
+RERANK_SWEEP = [0, 2, 4, 8]   # 0 = codes only
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        config = yaml.safe_load(yaml_file)
+        return config
+
+def recall_at_k(truth, found):
+    hits = [len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]
+    return float(np.mean(hits))
+
+# size of one stored code, ignoring ids and graph links
+def bytes_per_vector(index):
+    if isinstance(index, faiss.IndexBinary):
+        return index.code_size
+    return getattr(base_index(index), "code_size", index.d * 4)
+
+# search one query at a time, like the assistant does; compact codes can be
+# re-ranked exactly from rerank_factor * k candidates
+def timed_search(index, queries, k, corpus=None, rerank_factor=4):
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        if corpus is None:
+            _, ids = search_index(index, q[None, :], k)
+            found.append(ids[0])
+            continue
+        _, ids = search_index(index, q[None, :], k * rerank_factor)
+        candidates = ids[0][ids[0] != -1]
+        distances = ((corpus[candidates] - q) ** 2).sum(axis=1)
+        found.append(candidates[np.argsort(distances, kind="stable")[:k]])
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return found, latency_ms
+
+def faiss_recall_report(config_path, sample_size, num_queries, k, index_types):
+    config = read_param(config_path)
+    faiss_cfg = get_faiss_config(config)
+
+    # Embed a sample of prompts and hold some out as queries
+    df = pd.read_csv(config["data"]["loc"], usecols=["sql_prompt"])
+    df = df.sample(n=min(sample_size + num_queries, len(df)), random_state=0)
+    texts = df["sql_prompt"].astype(str).tolist()
+    embeddings = np.asarray(get_embedding_service(config).encode(texts, show_progress_bar=True), dtype=np.float32)
+    corpus, queries = embeddings[num_queries:], embeddings[:num_queries]
+
+    # Exact baseline
+    flat = faiss.IndexFlatL2(corpus.shape[1])
+    flat.add(corpus)
+    truth, flat_ms = timed_search(flat, queries, k)
+    report = {
+        "corpus_size": len(corpus),
+        "num_queries": len(queries),
+        "k": k,
+        "results": [{"index_type": "flat", "recall": 1.0, "latency_ms": flat_ms, "build_s": 0.0}]
+    }
+    print(f"flat          recall@{k}=1.000  {flat_ms:.3f} ms/query")
+
+    for index_type in index_types:
+        cfg = {**faiss_cfg, "index_type": index_type}
+        start = time.perf_counter()
+        index = build_trained_index(corpus, cfg)
+        build_s = time.perf_counter() - start
+
+        if index_type == "hnsw":
+            sweep = [("ef_search", v) for v in EF_SEARCH_SWEEP]
+        elif index_type in COMPRESSED_TYPES:
+            # no query knobs; compare the raw codes against float re-ranking
+            sweep = [("rerank_factor", v) for v in RERANK_SWEEP]
+        else:
+            sweep = [("nprobe", v) for v in NPROBE_SWEEP]
+
+        for knob, value in sweep:
+            if knob == "rerank_factor":
+                found, latency_ms = timed_search(index, queries, k, corpus if value else None, value)
+            else:
+                set_query_params(index, cfg, **{knob: value})
+                found, latency_ms = timed_search(index, queries, k)
+            recall = recall_at_k(truth, found)
+            report["results"].append({
+                "index_type": index_type,
+                knob: value,
+                "recall": recall,
+                "latency_ms": latency_ms,
+                "build_s": build_s,
+                "bytes_per_vector": bytes_per_vector(index)
+            })
+            print(f"{index_type:<13} {knob}={value:<4} recall@{k}={recall:.3f}  {latency_ms:.3f} ms/query")
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index types against the flat baseline")
+    parser.add_argument("--config", default="params.yaml")
+    parser.add_argument("--sample-size", type=int, default=50000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-types", nargs="+", default=[t for t in INDEX_TYPES if t != "flat"])
+    parser.add_argument("--output", default="reports/faiss_recall_report.json")
+    parsed_args = parser.parse_args()
+
+    report = faiss_recall_report(
+        parsed_args.config,
+        parsed_args.sample_size,
+        parsed_args.num_queries,
+        parsed_args.k,
+        parsed_args.index_types
+    )
+    os.makedirs(os.path.dirname(parsed_args.output) or ".", exist_ok=True)
+    with open(parsed_args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Report saved to {parsed_args.output}")
@@ -0,0 +1,194 @@
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from schema_index import SQL_KEYWORDS
+from store_versions import new_version_dir, publish_version, store_dir
+
+# On-disk layout (one versioned directory per index, see store_versions.py):
+#   meta.json      tokenizer, fields, document count and average length, written last
+#   vocab.json     terms; a term's id is its position
+#   offsets.bin    int64 start of each term's postings, one per term plus one
+#   docs.bin       int32 document positions, grouped by term and sorted within a term
+#   tfs.bin        uint16 term frequency per posting
+#   doc_lens.bin   int32 tokens per document
+#   keys.bin       int64 row key per document (the id used in the vector stores)
+META_FILE = "meta.json"
+
+WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+
+# identifiers and words, with snake_case parts as extra tokens
+def word_tokens(text):
+    tokens = []
+    for token in WORD_RE.findall(str(text).lower()):
+        if token in SQL_KEYWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if len(part) > 1)
+    return [t for t in tokens if len(t) > 1]
+
+TOKENIZERS = {
+    "words": word_tokens,
+}
+
+def is_lexical_index(path):
+    return os.path.exists(os.path.join(store_dir(path), META_FILE))
+
+def reciprocal_rank_fusion(hit_lists, k=60):
+    """Fuse ranked [(key, score)] lists by summing 1 / (k + rank) per key."""
+    fused = {}
+    for hits in hit_lists:
+        for rank, (key, _) in enumerate(hits, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndexWriter:
+    """
+    Builds a BM25 inverted index from DataFrame chunks. Postings are kept as
+    flat arrays per chunk and sorted into term order once, on close.
+    """
+
+    def __init__(self, path, fields, tokenizer="words"):
+        self.path = path
+        self.fields = list(fields)
+        self.tokenizer = tokenizer
+        self._tokenize = TOKENIZERS[tokenizer]
+        self._vocab = {}
+        self._terms, self._docs, self._tfs = [], [], []
+        self._doc_lens, self._keys = [], []
+        self.num_docs = 0
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, df, keys):
+        texts = df[self.fields].fillna("").astype(str).agg(" ".join, axis=1)
+        terms, docs, tfs, lens = [], [], [], []
+        for i, text in enumerate(texts):
+            tokens = self._tokenize(text)
+            lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                terms.append(self._vocab.setdefault(term, len(self._vocab)))
+                docs.append(self.num_docs + i)
+                tfs.append(tf)
+        self._terms.append(np.asarray(terms, dtype=np.int64))
+        self._docs.append(np.asarray(docs, dtype=np.int32))
+        self._tfs.append(np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16))
+        self._doc_lens.append(np.asarray(lens, dtype=np.int32))
+        self._keys.append(np.asarray(keys, dtype=np.int64))
+        self.num_docs += len(texts)
+
+    def close(self):
+        terms = np.concatenate(self._terms) if self._terms else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(self._docs) if self._docs else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate(self._tfs) if self._tfs else np.zeros(0, dtype=np.uint16)
+        doc_lens = np.concatenate(self._doc_lens) if self._doc_lens else np.zeros(0, dtype=np.int32)
+        keys = np.concatenate(self._keys) if self._keys else np.zeros(0, dtype=np.int64)
+
+        # a running LexicalIndex keeps the live files mapped, so write a new version
+        version_dir = new_version_dir(self.path)
+        order = np.lexsort((docs, terms))
+        offsets = np.searchsorted(terms[order], np.arange(len(self._vocab) + 1)).astype(np.int64)
+        offsets.tofile(os.path.join(version_dir, "offsets.bin"))
+        docs[order].tofile(os.path.join(version_dir, "docs.bin"))
+        tfs[order].tofile(os.path.join(version_dir, "tfs.bin"))
+        doc_lens.tofile(os.path.join(version_dir, "doc_lens.bin"))
+        keys.tofile(os.path.join(version_dir, "keys.bin"))
+        with open(os.path.join(version_dir, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(self._vocab, key=self._vocab.get), f)
+
+        meta = {
+            "tokenizer": self.tokenizer,
+            "fields": self.fields,
+            "num_docs": int(self.num_docs),
+            "avg_doc_len": float(doc_lens.mean()) if len(doc_lens) else 0.0
+        }
+        with open(os.path.join(version_dir, META_FILE), "w") as f:
+            json.dump(meta, f)
+        publish_version(self.path, version_dir)
+        print(f"🔤 Saved lexical index over {', '.join(self.fields)} ({self.num_docs} docs, {len(self._vocab)} terms)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+class LexicalIndex:
+    """Memory-mapped BM25 index; a query touches only the postings of its own terms."""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        path = store_dir(path)
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.tokenize = TOKENIZERS[meta["tokenizer"]]
+        self.fields = meta["fields"]
+        self.num_docs = meta["num_docs"]
+        self.k1 = k1
+        self.b = b
+
+        def load(name, dtype):
+            file = os.path.join(path, name)
+            return np.memmap(file, dtype=dtype, mode="r") if os.path.getsize(file) else np.zeros(0, dtype=dtype)
+
+        self.offsets = load("offsets.bin", np.int64)
+        self.docs = load("docs.bin", np.int32)
+        self.tfs = load("tfs.bin", np.uint16)
+        self.keys = load("keys.bin", np.int64)
+        # per-document length normalisation, computed once
+        doc_lens = load("doc_lens.bin", np.int32).astype(np.float32)
+        avg_len = meta["avg_doc_len"] or 1.0
+        self.norms = (k1 * (1 - b + b * doc_lens / avg_len)).astype(np.float32)
+
+    def query_terms(self, query):
+        return [self.vocab[t] for t in dict.fromkeys(self.tokenize(query)) if t in self.vocab]
+
+    def _postings(self, term_id):
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def _idf(self, df):
+        return np.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, top_k):
+        """BM25 top_k as [(key, score)], plus the fraction of query terms the best document contains."""
+        term_ids = self.query_terms(query)
+        if not term_ids or not self.num_docs:
+            return [], 0.0
+
+        # scores only for documents in the query's postings, not the whole corpus
+        postings = [self._postings(t) for t in term_ids]
+        parts = []
+        for docs, tfs in postings:
+            tf = tfs.astype(np.float32)
+            parts.append(self._idf(len(docs)) * tf * (self.k1 + 1) / (tf + self.norms[docs]))
+        candidates, inverse = np.unique(np.concatenate([docs for docs, _ in postings]), return_inverse=True)
+        if not len(candidates):
+            return [], 0.0
+        scores = np.bincount(inverse, weights=np.concatenate(parts), minlength=len(candidates))
+
+        top_k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        if not len(top):
+            return [], 0.0
+        scores, top = scores[top], candidates[top]
+
+        # postings are sorted by document, so membership is a binary search
+        best = top[0]
+        matched = sum(
+            1 for docs, _ in postings
+            if (i := np.searchsorted(docs, best)) < len(docs) and docs[i] == best
+        )
+        hits = [(int(self.keys[d]), float(score)) for d, score in zip(top, scores)]
+        return hits, matched / len(term_ids)
+
+    def is_confident(self, hits, coverage, min_coverage=1.0, margin=2.0):
+        """True when the best document has all (min_coverage) query terms and clearly beats the runner-up."""
+        if not hits or coverage < min_coverage:
+            return False
+        return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
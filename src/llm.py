@@ -1,18 +1,79 @@
+import json
 import os
 import re
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # Load environment variables from .env
 load_dotenv()
 
-def query_groq_llama(user_input: str, context: str = "", config=None) -> str:
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+SYSTEM_PROMPT = "You are an expert SQL assistant. Only return valid SQL code. No explanations. And donot give it in bash format. Give as a single statement. Do not give me in markdown"
+
+class BoundedRetry(Retry):
+    """Retry that waits at most max_retry_after seconds for a Retry-After header."""
+
+    def __init__(self, *args, max_retry_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    # urllib3 builds a fresh Retry after every attempt
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None or self.max_retry_after is None:
+            return retry_after
+        return min(retry_after, self.max_retry_after)
+
+# one keep-alive session per process, shared by every suggestion
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(config):
+    global _session
+    with _session_lock:
+        if _session is None:
+            llm_cfg = config.get("llm", {})
+            # Connection failures and 429/5xx answers are retried; a read timeout
+            # is not, since the request already waited read_timeout for nothing
+            retry = BoundedRetry(
+                total=llm_cfg.get("max_retries", 3),
+                read=0,
+                backoff_factor=llm_cfg.get("backoff_factor", 0.5),
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["POST"]),
+                respect_retry_after_header=True,
+                max_retry_after=llm_cfg.get("max_retry_after", 5),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_maxsize=llm_cfg.get("pool_maxsize", 4), max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def get_timeout(config):
+    llm_cfg = config.get("llm", {})
+    return (llm_cfg.get("connect_timeout", 3.05), llm_cfg.get("read_timeout", 30))
+
+def build_request(user_input, context, config):
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
         raise ValueError("GROQ_API_KEY environment variable not set.")
     model_name = config["llm"]["model_name"]
-    
-    url = "https://api.groq.com/openai/v1/chat/completions"
+
+    url = f"{config['llm'].get('base_url', DEFAULT_BASE_URL).rstrip('/')}/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -30,17 +91,86 @@ User Input: {user_input}
     data = {
         "model": model_name,
         "messages": [
-            {"role": "system", "content": "You are an expert SQL assistant. Only return valid SQL code. No explanations. And donot give it in bash format. Give as a single statement. Do not give me in markdown"},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": full_prompt}
         ],
         "temperature": 0
     }
+    return url, headers, data
 
-    response = requests.post(url, headers=headers, json=data)
+SQL_START = re.compile(r"(?i)\b(select|insert|update|delete|with|create|drop|alter)\b(?=.)", re.DOTALL)
+
+# Extract valid SQL using regex (starts with common SQL keywords)
+def extract_sql(raw_output):
+    match = SQL_START.search(raw_output)
+    return raw_output[match.start():].strip() if match else raw_output.strip()
+
+class StreamingSQLExtractor:
+    """
+    Runs the SQL-extraction regex over a growing completion and releases only
+    text that extract_sql would keep, so the pieces join up to its result.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.start = None
+        self.emitted = 0
+
+    def feed(self, delta):
+        self.raw += delta
+        if self.start is None:
+            match = SQL_START.search(self.raw)
+            if not match:
+                return ""
+            self.start = match.start()
+        # trailing whitespace is held back because the final result is stripped
+        text = self.raw[self.start:].rstrip()
+        piece = text[self.emitted:]
+        self.emitted = max(self.emitted, len(text))
+        return piece
+
+    def finish(self):
+        # no SQL keyword ever showed up: fall back to the whole reply
+        if self.start is None:
+            return self.raw.strip()
+        return ""
+
+def query_groq_llama(user_input: str, context: str = "", config=None, trace=None) -> str:
+    url, headers, data = build_request(user_input, context, config)
+
+    response = get_session(config).post(url, headers=headers, json=data, timeout=get_timeout(config))
+    if trace is not None:
+        # time until the response headers arrived
+        trace.record("llm_ttfb", response.elapsed.total_seconds() * 1000)
     response.raise_for_status()
     raw_output = response.json()["choices"][0]["message"]["content"]
+    return extract_sql(raw_output)
+
+# OpenAI-compatible SSE stream; yields clean SQL pieces as soon as they arrive
+def stream_groq_llama(user_input: str, context: str = "", config=None, trace=None):
+    url, headers, data = build_request(user_input, context, config)
+    data["stream"] = True
+
+    extractor = StreamingSQLExtractor()
+    start = time.perf_counter()
+    first_event = True
+    with get_session(config).post(url, headers=headers, json=data, timeout=get_timeout(config), stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            if first_event and trace is not None:
+                # time until the first streamed event, not just the headers
+                trace.since("llm_ttfb", start)
+            first_event = False
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            delta = json.loads(payload)["choices"][0].get("delta", {}).get("content") or ""
+            piece = extractor.feed(delta)
+            if piece:
+                yield piece
 
-    # Extract valid SQL using regex (starts with common SQL keywords)
-    match = re.search(r"(?i)\b(select|insert|update|delete|with|create|drop|alter)\b.+", raw_output, re.DOTALL)
-    clean_sql = match.group(0).strip() if match else raw_output.strip()
-    return clean_sql
\ No newline at end of file
+    rest = extractor.finish()
+    if rest:
+        yield rest
@@ -1,6 +1,7 @@
 from datasets import load_dataset
 import argparse
 import yaml
+from dedupe_corpus import dedupe_corpus
 
 def read_param(config_path):
     with open(config_path) as yaml_file:
@@ -14,6 +15,10 @@ def get_data(config_path):
     data_path = config["data"]["loc"]
     df.to_csv(data_path, index=False)
     print(f"Dataset saved at {data_path}")
+
+    # collapse near-duplicate examples before anything gets indexed
+    if config["data"].get("dedupe", {}).get("enable", False):
+        dedupe_corpus(config)
     return df
 
 if __name__ == "__main__":
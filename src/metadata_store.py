@@ -0,0 +1,146 @@
+import json
+import os
+import numpy as np
+from store_versions import discard_version, new_version_dir, publish_version, store_dir
+
+# On-disk layout (one versioned directory per store, see store_versions.py):
+#   meta.json      column names and row count, written last
+#   col_<i>.bin    JSON-encoded cell values of column i, back to back
+#   col_<i>.off    int64 byte offsets into col_<i>.bin, one per row plus one
+#   keys.bin       int64 stable row key (the id used in the vector stores)
+META_FILE = "meta.json"
+
+# stable key per row: the dataset id when it is unique, otherwise the row position
+# (CSV chunks keep a running index, so positions stay global)
+def row_keys(df):
+    if "id" in df.columns and df["id"].is_unique:
+        return df["id"].to_numpy(dtype=np.int64)
+    return df.index.to_numpy(dtype=np.int64)
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+class MetadataStoreWriter:
+    """
+    Appends DataFrame chunks to a columnar metadata store so rows can be
+    written as they are produced instead of held in memory. Rows go to a new
+    version that replaces the live one on close.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.num_rows = 0
+        self._bins = []
+        self._offs = []
+        self._ends = []
+        self._keys = None
+        os.makedirs(path, exist_ok=True)
+        self.version_dir = new_version_dir(path)
+
+    def _open(self, columns):
+        self.columns = list(columns)
+        for i in range(len(self.columns)):
+            self._bins.append(open(os.path.join(self.version_dir, f"col_{i}.bin"), "wb"))
+            off = open(os.path.join(self.version_dir, f"col_{i}.off"), "wb")
+            off.write(np.array([0], dtype=np.int64).tobytes())
+            self._offs.append(off)
+            self._ends.append(0)
+        self._keys = open(os.path.join(self.version_dir, "keys.bin"), "wb")
+
+    def append(self, df, keys=None):
+        if self.columns is None:
+            self._open(df.columns)
+        if keys is None:
+            keys = np.arange(self.num_rows, self.num_rows + len(df))
+        self._keys.write(np.asarray(keys, dtype=np.int64).tobytes())
+        for i, column in enumerate(self.columns):
+            blobs = [_encode(v) for v in df[column].tolist()]
+            offsets = self._ends[i] + np.cumsum([len(b) for b in blobs], dtype=np.int64)
+            self._bins[i].write(b"".join(blobs))
+            self._offs[i].write(offsets.tobytes())
+            if len(offsets):
+                self._ends[i] = int(offsets[-1])
+        self.num_rows += len(df)
+
+    def _files(self):
+        return self._bins + self._offs + ([self._keys] if self._keys else [])
+
+    def close(self):
+        for f in self._files():
+            f.close()
+        with open(os.path.join(self.version_dir, META_FILE), "w") as f:
+            json.dump({"columns": self.columns or [], "num_rows": self.num_rows}, f)
+        publish_version(self.path, self.version_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self._files():
+                f.close()
+            discard_version(self.version_dir)
+
+def write_metadata_store(df, path, keys=None):
+    with MetadataStoreWriter(path) as writer:
+        writer.append(df, keys)
+    print(f"📄 Saved {len(df)} metadata rows to {path}")
+
+def _memmap(path, dtype):
+    # zero-length files cannot be mapped
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+class MetadataStore:
+    """
+    Read-only, memory-mapped view of a columnar metadata store. Only the rows
+    that are asked for are decoded, so opening the store is near-instant.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        path = store_dir(path)
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.columns = meta["columns"]
+        self.num_rows = meta["num_rows"]
+        self._bins = [_memmap(os.path.join(path, f"col_{i}.bin"), np.uint8) for i in range(len(self.columns))]
+        self._offs = [_memmap(os.path.join(path, f"col_{i}.off"), np.int64) for i in range(len(self.columns))]
+
+        # stores written before row keys existed are keyed by position
+        keys_path = os.path.join(path, "keys.bin")
+        self.keys = _memmap(keys_path, np.int64) if os.path.exists(keys_path) else np.arange(self.num_rows)
+        self._key_order = np.argsort(self.keys, kind="stable")
+        self._sorted_keys = self.keys[self._key_order]
+
+    def __len__(self):
+        return self.num_rows
+
+    def _cell(self, col_idx, row):
+        start, end = self._offs[col_idx][row], self._offs[col_idx][row + 1]
+        return json.loads(self._bins[col_idx][start:end].tobytes().decode("utf-8"))
+
+    def get(self, row, column):
+        return self._cell(self.columns.index(column), row)
+
+    def __getitem__(self, row):
+        if row < 0 or row >= self.num_rows:
+            raise IndexError(f"row {row} out of range for {self.num_rows} rows")
+        return {name: self._cell(i, row) for i, name in enumerate(self.columns)}
+
+    def row_for_key(self, key):
+        pos = np.searchsorted(self._sorted_keys, key)
+        if pos == len(self._sorted_keys) or self._sorted_keys[pos] != key:
+            return None
+        return int(self._key_order[pos])
+
+    def get_by_key(self, key):
+        row = self.row_for_key(key)
+        return None if row is None else self[row]
+
+def is_metadata_store(path):
+    return os.path.isfile(os.path.join(store_dir(path), META_FILE))
@@ -0,0 +1,145 @@
+import json
+import math
+import os
+import time
+from event_log import EventLogReader
+from timing import PERCENTILES
+
+GROUP_BY = ("model", "vector_store", "db_name")
+
+# log-spaced latency buckets: 1 ms .. ~17 min, 64 per power of ten, so each
+# bucket is ~3.7% wide and interpolated percentiles land within about 2%
+BUCKETS_PER_DECADE = 64
+MAX_BUCKET = 6 * BUCKETS_PER_DECADE
+
+def latency_bucket(ms):
+    if ms <= 1:
+        return 0
+    return min(MAX_BUCKET, math.ceil(math.log10(ms) * BUCKETS_PER_DECADE))
+
+def bucket_upper_ms(bucket):
+    return 10 ** (bucket / BUCKETS_PER_DECADE)
+
+def histogram_percentile(histogram, p):
+    # the p-th percentile, interpolated log-linearly inside its bucket
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = p / 100 * total
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        count = histogram[bucket]
+        if count and seen + count >= rank:
+            bucket = int(bucket)
+            fraction = (rank - seen) / count
+            upper = bucket_upper_ms(bucket)
+            if bucket == 0:
+                return round(upper * fraction, 2)
+            lower = bucket_upper_ms(bucket - 1)
+            return round(lower * (upper / lower) ** fraction, 2)
+        seen += count
+    return None
+
+class WindowedAggregator:
+    """
+    Incremental acceptance and latency metrics per model, vector store and
+    database over rolling windows.
+
+    Each run reads the event log from the saved (segment, offset) onward and
+    folds new events into fixed time slots holding counts and a log-spaced
+    latency histogram. Rolling windows are sums over the slots inside them,
+    and slots older than the longest window are dropped, so a run costs
+    O(new events) no matter how long the history is.
+    """
+
+    def __init__(self, log_dir, state_path, windows_minutes=None, slot_minutes=5):
+        self.reader = EventLogReader(log_dir)
+        self.state_path = state_path
+        self.windows = windows_minutes or {"1h": 60, "24h": 1440, "7d": 10080}
+        self.slot_seconds = slot_minutes * 60
+        self.state = self._load_state()
+
+    def _load_state(self):
+        state = {"position": None, "slots": {}, "runs": {}, "buckets_per_decade": BUCKETS_PER_DECADE}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            # histograms with another bucket layout cannot be merged: keep the
+            # MLflow runs and rebuild the slots from the start of the log
+            if saved.get("buckets_per_decade") == BUCKETS_PER_DECADE:
+                return saved
+            state["runs"] = saved.get("runs", {})
+        return state
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _add(self, group, event):
+        slot = str(int(event["ts"] // self.slot_seconds * self.slot_seconds))
+        counts = self.state["slots"].setdefault(group, {}).setdefault(
+            slot, {"total": 0, "accepted": 0, "dismissed": 0, "latency": {}}
+        )
+        counts["total"] += 1
+        if event.get("status") == "ACCEPTED":
+            counts["accepted"] += 1
+        elif event.get("status") == "DISMISSED":
+            counts["dismissed"] += 1
+        if event.get("latency_ms") is not None:
+            bucket = str(latency_bucket(float(event["latency_ms"])))
+            counts["latency"][bucket] = counts["latency"].get(bucket, 0) + 1
+
+    # Fold in events written since the last run; returns the groups that changed
+    def consume(self):
+        changed = {}
+        position = self.state["position"]
+        for event, position in self.reader.iter_from(self.state["position"]):
+            if not event or "ts" not in event:
+                continue
+            for dimension in GROUP_BY:
+                group = f"{dimension}={event.get(dimension, 'N/A')}"
+                self._add(group, event)
+                changed[group] = changed.get(group, 0) + 1
+        self.state["position"] = position
+        return changed
+
+    def _prune(self, now):
+        oldest = now - max(self.windows.values()) * 60 - self.slot_seconds
+        for group, slots in self.state["slots"].items():
+            for slot in [s for s in slots if int(s) < oldest]:
+                del slots[slot]
+
+    def window_metrics(self, group, now=None):
+        now = now or time.time()
+        metrics = {}
+        for name, minutes in self.windows.items():
+            start = now - minutes * 60
+            total = accepted = dismissed = 0
+            histogram = {}
+            for slot, counts in self.state["slots"].get(group, {}).items():
+                # a slot counts once any part of it falls inside the window
+                if int(slot) + self.slot_seconds <= start:
+                    continue
+                total += counts["total"]
+                accepted += counts["accepted"]
+                dismissed += counts["dismissed"]
+                for bucket, n in counts["latency"].items():
+                    histogram[bucket] = histogram.get(bucket, 0) + n
+            metrics[f"{name}_total_count"] = total
+            metrics[f"{name}_acceptance_rate"] = accepted / total if total else 0
+            metrics[f"{name}_rejection_rate"] = dismissed / total if total else 0
+            for p in PERCENTILES:
+                value = histogram_percentile(histogram, p)
+                if value is not None:
+                    metrics[f"{name}_latency_ms_p{p}"] = value
+        return metrics
+
+    def run(self, now=None):
+        """Consume new events and return {group: window metrics} for the groups that changed."""
+        now = now or time.time()
+        changed = self.consume()
+        self._prune(now)
+        return {group: {"new_events": n, **self.window_metrics(group, now)} for group, n in changed.items()}
@@ -1,95 +1,126 @@
 import mlflow
-import pandas as pd
+import json
+import time
 from retrieve_context import read_param
 import argparse
 from urllib.parse import urlparse
+from event_log import EventLogReader
+from metrics_aggregator import WindowedAggregator
 
 # Set up MLflow tracking
 mlflow.set_tracking_uri("http://localhost:5000")
 mlflow.set_experiment("sql-copilot-acceptance-metrics")
 
-def log_acceptance_metrics_per_model(config_path, csv_path=f"logs/suggestions_log.csv"):
+def log_acceptance_metrics_per_model(config_path, since=None, until=None):
     # Load the configuration
     config = read_param(config_path)
-    # Load the full CSV
-    df = pd.read_csv(csv_path)
-
-    summary = {}
-
-    # copy dataframe
-    df_model = df.copy()
-
-    # Calculate metrics
-    total_suggestions = len(df_model)
-    accepted = len(df_model[df_model['status'] == 'ACCEPTED'])
-    rejected = len(df_model[df_model['status'] == 'DISMISSED'])
-    acceptance_rate = accepted / total_suggestions if total_suggestions > 0 else 0
-    rejection_rate = rejected / total_suggestions if total_suggestions > 0 else 0
-
-    avg_latency = df_model["latency_ms"].mean() if "latency_ms" in df_model else None
-    max_latency = df_model["latency_ms"].max() if "latency_ms" in df_model else None
-    min_latency = df_model["latency_ms"].min() if "latency_ms" in df_model else None
-
-    # Grab optional columns if available
-    embedding_model = df_model['embedding_model'].iloc[0] if 'embedding_model' in df_model else "N/A"
-    vector_store = df_model['vector_store'].iloc[0] if 'vector_store' in df_model else "N/A"
-
-    # Start MLflow run
-    with mlflow.start_run(run_name=f"{df_model['model'][0]}_run"):
-        mlflow.log_param("model_name",df_model['model'][0])
-        mlflow.log_param("data_size", total_suggestions)
-        mlflow.log_param("embedding_model", embedding_model)
-        mlflow.log_param("vector_store", vector_store)
-
-        mlflow.log_metric("acceptance_rate", acceptance_rate)
-        mlflow.log_metric("rejection_rate", rejection_rate)
-        mlflow.log_metric("accepted_count", accepted)
-        mlflow.log_metric("rejected_count", rejected)
-        mlflow.log_metric("total_count", total_suggestions)
-
-        if avg_latency is not None:
-            mlflow.log_metric("avg_latency_ms", avg_latency)
-            mlflow.log_metric("min_latency_ms", min_latency)
-            mlflow.log_metric("max_latency_ms", max_latency)
-
-        # Log filtered data per model as artifact
-        model_csv_path = f"logs/{df_model['model'][0].replace('/', '_')}_log.csv"
-        df_model.to_csv(model_csv_path, index=False)
-        mlflow.log_artifact(model_csv_path)
-
-        tracking_uri_type = urlparse(mlflow.get_tracking_uri()).scheme
-        print("\n\n",tracking_uri_type,"\n\n")
-        if tracking_uri_type != "file":
-            mlflow.pyfunc.log_model(df_model['model'][0], "model", registered_model_name=df_model['model'][0].replace('/', '_'))
-        else:
-            mlflow.pyfunc.log_model(df_model['model'][0], "model")
-
-    # Store for printing or reporting
-    summary[df_model['model'][0]] = {
-        "acceptance_rate": acceptance_rate,
-        "rejection_rate": rejection_rate,
-        "accepted_count": accepted,
-        "rejected_count": rejected,
-        "avg_latency_ms": avg_latency,
-        "min_latency_ms": min_latency,
-        "max_latency_ms": max_latency
-    }
+    log_dir = config.get("event_log", {}).get("dir", "logs/events")
+    reader = EventLogReader(log_dir)
+
+    # One streaming pass over the segments in range
+    summary = reader.aggregate(since, until, group_by="model")
+
+    # One more pass buckets the events into a log file per model
+    model_log_paths = {model_name: f"logs/{model_name.replace('/', '_')}_log.ndjson" for model_name in summary}
+    model_logs = {model_name: open(path, "w", encoding="utf-8") for model_name, path in model_log_paths.items()}
+    try:
+        for event in reader.iter_events(since, until):
+            f = model_logs.get(event.get("model", "N/A"))
+            if f is not None:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    finally:
+        for f in model_logs.values():
+            f.close()
+
+    for model_name, metrics in summary.items():
+        # Start MLflow run
+        with mlflow.start_run(run_name=f"{model_name}_run"):
+            mlflow.log_param("model_name", model_name)
+            mlflow.log_param("data_size", metrics["total_count"])
+            mlflow.log_param("embedding_model", metrics["embedding_model"])
+            mlflow.log_param("vector_store", metrics["vector_store"])
+            if since or until:
+                mlflow.log_param("time_range", f"{since or ''}..{until or ''}")
+
+            for name in ("acceptance_rate", "rejection_rate", "accepted_count", "rejected_count", "total_count"):
+                mlflow.log_metric(name, metrics[name])
+
+            if metrics["avg_latency_ms"] is not None:
+                mlflow.log_metric("avg_latency_ms", metrics["avg_latency_ms"])
+                mlflow.log_metric("min_latency_ms", metrics["min_latency_ms"])
+                mlflow.log_metric("max_latency_ms", metrics["max_latency_ms"])
+
+            # p50/p95/p99 of the end-to-end latency and of every recorded stage
+            for column, percentiles in metrics["percentiles"].items():
+                for name, value in percentiles.items():
+                    mlflow.log_metric(f"{column}_{name}", value)
+
+            # Log the events of this model as an artifact
+            mlflow.log_artifact(model_log_paths[model_name])
+
+            tracking_uri_type = urlparse(mlflow.get_tracking_uri()).scheme
+            print("\n\n",tracking_uri_type,"\n\n")
+            if tracking_uri_type != "file":
+                mlflow.pyfunc.log_model(model_name, "model", registered_model_name=model_name.replace('/', '_'))
+            else:
+                mlflow.pyfunc.log_model(model_name, "model")
 
     return summary
 
-
+# Scheduled job: fold in only the events since the last run and append one
+# point per changed group to that group's long-lived MLflow run
+def log_windowed_metrics(config_path):
+    config = read_param(config_path)
+    metrics_cfg = config.get("metrics", {})
+    aggregator = WindowedAggregator(
+        config.get("event_log", {}).get("dir", "logs/events"),
+        metrics_cfg.get("state_path", "logs/metrics_state.json"),
+        windows_minutes=metrics_cfg.get("windows_minutes"),
+        slot_minutes=metrics_cfg.get("slot_minutes", 5)
+    )
+
+    now = time.time()
+    results = aggregator.run(now)
+    for group, metrics in results.items():
+        dimension, value = group.split("=", 1)
+        run_id = aggregator.state["runs"].get(group)
+        with mlflow.start_run(run_id=run_id, run_name=None if run_id else f"{dimension}_{value}_windows") as run:
+            if run_id is None:
+                mlflow.log_param(dimension, value)
+                aggregator.state["runs"][group] = run.info.run_id
+            mlflow.log_metrics(metrics, step=int(now))
+
+    # the offset only moves forward once MLflow has the numbers
+    aggregator.save()
+    return results
 
 # Example usage
 if __name__ == "__main__":
     args = argparse.ArgumentParser()
     args.add_argument("--config", default="params.yaml")
+    args.add_argument("--since", default=None, help="ISO timestamp, e.g. 2024-01-01T00:00")
+    args.add_argument("--until", default=None)
+    args.add_argument("--incremental", action="store_true", help="rolling-window metrics for new events only")
     parsed_args = args.parse_args()
 
-    results = log_acceptance_metrics_per_model(config_path=parsed_args.config)
-
-    print("\n📊 Model-wise Acceptance Metrics:")
-    for model, metrics in results.items():
-        print(f"\n🔹 Model: {model}")
-        print(f"  - Acceptance Rate: {metrics['acceptance_rate']:.2%}")
-        print(f"  - Rejection Rate: {metrics['rejection_rate']:.2%}")
-        print(f"  - Avg Latency: {metrics['avg_latency_ms']:.2f} ms")
\ No newline at end of file
+    if parsed_args.incremental:
+        results = log_windowed_metrics(config_path=parsed_args.config)
+        print(f"\n📈 Updated {len(results)} metric groups")
+        for group, metrics in results.items():
+            print(f"  - {group}: +{metrics['new_events']} events")
+    else:
+        results = log_acceptance_metrics_per_model(
+            config_path=parsed_args.config,
+            since=parsed_args.since,
+            until=parsed_args.until
+        )
+
+        print("\n📊 Model-wise Acceptance Metrics:")
+        for model, metrics in results.items():
+            print(f"\n🔹 Model: {model}")
+            print(f"  - Acceptance Rate: {metrics['acceptance_rate']:.2%}")
+            print(f"  - Rejection Rate: {metrics['rejection_rate']:.2%}")
+            if metrics["avg_latency_ms"] is not None:
+                print(f"  - Avg Latency: {metrics['avg_latency_ms']:.2f} ms")
+            else:
+                print("  - Avg Latency: n/a")
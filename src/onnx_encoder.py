@@ -0,0 +1,76 @@
+import json
+import os
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+# Exported model directory (see export_onnx_encoder.py):
+#   encoder.json     source model, dimension, max length, pooling and normalisation
+#   tokenizer.json   fast tokenizer
+#   model.onnx       transformer returning token embeddings
+#   model.int8.onnx  same graph with dynamically quantized int8 weights (optional)
+ENCODER_FILE = "encoder.json"
+
+def onnx_model_file(model_dir, quantized):
+    return os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+
+def is_onnx_encoder(model_dir, quantized=False):
+    return os.path.exists(os.path.join(model_dir, ENCODER_FILE)) and os.path.exists(onnx_model_file(model_dir, quantized))
+
+class OnnxEncoder:
+    """
+    Sentence-transformer forward pass on ONNX Runtime: tokenize, run the
+    transformer, pool and normalise the same way the PyTorch model does.
+    Exposes the subset of SentenceTransformer.encode the service uses.
+    """
+
+    def __init__(self, model_dir, quantized=False, threads=0):
+        with open(os.path.join(model_dir, ENCODER_FILE)) as f:
+            meta = json.load(f)
+        self.model_name = meta["model_name"]
+        self.pooling = meta["pooling"]
+        self.normalize = meta["normalize"]
+        self.dim = meta["dim"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(meta["max_length"])
+        self.tokenizer.enable_padding(pad_id=meta["pad_id"], pad_token=meta["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or 0
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            onnx_model_file(model_dir, quantized), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _forward(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        features = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        token_embeddings = self.session.run(None, {name: features[name] for name in self.input_names})[0]
+
+        if self.pooling == "cls":
+            pooled = token_embeddings[:, 0]
+        else:
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False):
+        if isinstance(texts, str):
+            return self._forward([texts])[0]
+        if not len(texts):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # similar lengths per batch keep padding short
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self._forward([texts[i] for i in rows])
+        return out
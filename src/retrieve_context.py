@@ -1,147 +1,308 @@
-import faiss
-import pickle
 from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
-import numpy as np
+import pandas as pd
 import chromadb
 import argparse
 import yaml
 import os
+import threading
+import time
 from loading_data import get_data
+from dedupe_corpus import corpus_path
+from embeddings import get_embedding_service
+from batching import MicroBatcher
+from lexical_index import LexicalIndex, is_lexical_index, reciprocal_rank_fusion
+from faiss_indexes import (
+    get_faiss_config, index_file_version, read_faiss_index, search_index, set_query_params, uses_rerank
+)
+from vector_file import VectorFile, rerank
+from sql_normalize import sql_skeleton
+from metadata_store import MetadataStore, is_metadata_store, row_keys, write_metadata_store
+from store_versions import current_version
+
+# how often a resident retriever looks for stores republished by a build
+RELOAD_CHECK_S = 1.0
 
 def read_param(config_path):
     with open(config_path) as yaml_file:
         config = yaml.safe_load(yaml_file)
         return config
 
-# Load metadata from pickle
-def load_metadata_from_pickle(metadata_path):
-    with open(metadata_path, "rb") as f:
-        metadata = pickle.load(f)
-    print(f"📄 Loaded {len(metadata)} metadata entries from {metadata_path}")
+# Open the memory-mapped metadata store, building it once if it is missing
+def load_metadata(config, config_path):
+    metadata_path = config["vector_store"]["metadata_path"]
+    if not is_metadata_store(metadata_path):
+        # prefer the CSV already on disk over re-downloading the dataset
+        if not os.path.exists(config["data"]["loc"]):
+            get_data(config_path)
+        df = pd.read_csv(corpus_path(config))
+        write_metadata_store(df, metadata_path, row_keys(df))
+    metadata = MetadataStore(metadata_path)
+    print(f"📄 Opened {len(metadata)} metadata entries from {metadata_path}")
     return metadata
 
-def retrieve_from_faiss(query, config,config_path , top_k):
+class Retriever:
+    """
+    Long-lived retriever that loads the vector index, the metadata and the
+    embedding model once and serves every lookup from memory.
+    """
 
-    # Get FAISS db
-    index = faiss.read_index(config["vector_store"]["path_to_save"])
+    def __init__(self, config, config_path="params.yaml"):
+        self.config = config
+        self.store_type = config["vector_store"]["type"].lower()
+        self.top_k = config["vector_store"]["top_k"]
+        self._batcher = None
+        self._reload_lock = threading.Lock()
+        self._checked_at = time.monotonic()
 
-    # save the metadata
-    df = get_data(config_path)
-    with open(config["vector_store"]["metadata_path"], "wb") as f:
-        pickle.dump(df.to_dict("records"), f)
+        if self.store_type not in ("faiss", "pinecone", "chromadb"):
+            raise ValueError(f"Unsupported vector store type: {self.store_type}")
 
-    # Get metadata
-    metadata = load_metadata_from_pickle(config["vector_store"]["metadata_path"])
+        self.metadata = load_metadata(config, config_path)
+        self.embedder = get_embedding_service(config)
 
-    # Load the Embedding model
-    model = SentenceTransformer(config["embedding_model"])
-    query_vector = model.encode([query])
+        # prompt embeddings, plus optionally a second store over SQL skeletons
+        self.target = self._open_target(config["vector_store"])
+        self.sql_cfg = config["vector_store"].get("sql_index", {})
+        self.sql_target = None
+        if self.sql_cfg.get("enable", False):
+            self.sql_target = self._open_target({**config["vector_store"], **self.sql_cfg})
 
-    # Query the database
-    distances, indices = index.search(np.array(query_vector), top_k)
-    results = [
-        {**metadata[i], "similarity_score": float(distances[0][idx])}
-        for idx, i in enumerate(indices[0])
-    ]
-    return results
+        # optional BM25 index over the same rows, fused with the dense results
+        self.lexical_cfg = config.get("lexical", {})
+        self.lexical = None
+        if self.lexical_cfg.get("enable", False):
+            self.lexical = self._open_lexical()
+            if self.lexical is None:
+                print(f"[WARN] Lexical index not found at {self.lexical_cfg['path']}—using dense retrieval only.")
 
-def retrieve_from_pinecone(query, config,config_path, top_k):
-    # Pinecone API details
-    api_key = os.getenv("PINECONE_API_KEY")
+        self._loaded_versions = self._store_versions()
+        print(f"✅ Retriever ready ({self.store_type}, {len(self.metadata)} rows)")
 
-    # Vector store config
-    index_name = config["vector_store"]["index_name"]
-    namespace = config["vector_store"]["namespace"]
-    metadata_path = config["vector_store"]["metadata_path"]
+    # what each on-disk store currently points at; a build that publishes changes it
+    def _store_versions(self):
+        vs_cfg = self.config["vector_store"]
+        versions = {"metadata": current_version(vs_cfg["metadata_path"])}
+        if self.lexical_cfg.get("enable", False):
+            versions["lexical"] = current_version(self.lexical_cfg["path"])
+        if self.store_type == "faiss":
+            paths = [vs_cfg["path_to_save"]] + ([self.sql_cfg["path_to_save"]] if self.sql_target is not None else [])
+            versions["faiss"] = tuple(index_file_version(path) for path in paths)
+            if uses_rerank(get_faiss_config(self.config)):
+                versions["faiss"] += tuple(current_version(f"{path}.vectors") for path in paths)
+        return versions
 
-    # save the metadata
-    df = get_data(config_path)
-    with open(metadata_path, "wb") as f:
-        pickle.dump(df.to_dict("records"), f)
-
-    # Initialize Pinecone client
-    pc = Pinecone(api_key=api_key)
-    index = pc.Index(config["vector_store"]["index_name"])
-
-    # Load embedding model
-    model = SentenceTransformer(config["embedding_model"])
-    query_vector = model.encode([query])[0].tolist()
-
-    # Query Pinecone
-    response = index.query(
-        vector=query_vector,
-        top_k=top_k,
-        include=["metadata", "score"],
-        namespace=namespace
-    )
-
-    # Load metadata
-    full_metadata = load_metadata_from_pickle(metadata_path)
-
-    # Format output like FAISS
-    results = []
-    for match in response['matches']:
-        idx = int(match['id'].split('-')[-1])
-        item_metadata = full_metadata[idx]
-        item_metadata["similarity_score"] = match["score"]
-        results.append(item_metadata)
-
-    return results
-
-def retrieve_from_chromadb(query, config,config_path, top_k):
-    # 1. Load metadata from pickle path
-    metadata_path = config["vector_store"]["metadata_path"]
+    def _reload(self, name):
+        if name == "metadata":
+            self.metadata = MetadataStore(self.config["vector_store"]["metadata_path"])
+        elif name == "lexical":
+            self.lexical = self._open_lexical()
+        elif name == "faiss":
+            # open both before swapping, so a failed reload leaves the pair as it was
+            target = self._open_target(self.config["vector_store"])
+            sql_target = self._open_target({**self.config["vector_store"], **self.sql_cfg}) if self.sql_target is not None else None
+            self.target, self.sql_target = target, sql_target
+
+    def _open_lexical(self):
+        lexical_path = self.lexical_cfg["path"]
+        if not is_lexical_index(lexical_path):
+            return None
+        return LexicalIndex(lexical_path, k1=self.lexical_cfg.get("k1", 1.2), b=self.lexical_cfg.get("b", 0.75))
+
+    # Searches keep using the stores they started with; new versions are
+    # swapped in between searches, at most once per RELOAD_CHECK_S
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_CHECK_S:
+            return
+        with self._reload_lock:
+            self._checked_at = now
+            versions = self._store_versions()
+            for name, version in versions.items():
+                if version == self._loaded_versions.get(name):
+                    continue
+                try:
+                    self._reload(name)
+                    self._loaded_versions[name] = version
+                    print(f"🔄 Reloaded {name} store")
+                except Exception as e:
+                    print(f"[WARN] Could not reload {name} store—keeping the loaded one. ({e})")
+
+    # (faiss index, re-ranking vectors or None), chroma collection or (pinecone index, namespace)
+    def _open_target(self, vs_cfg):
+        if self.store_type == "faiss":
+            faiss_cfg = get_faiss_config(self.config)
+            index = read_faiss_index(vs_cfg["path_to_save"], faiss_cfg)
+            set_query_params(index, faiss_cfg)
+            vectors = VectorFile(f"{vs_cfg['path_to_save']}.vectors") if uses_rerank(faiss_cfg) else None
+            return index, vectors
+        elif self.store_type == "pinecone":
+            pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            return pc.Index(vs_cfg["index_name"]), vs_cfg["namespace"]
+        client = chromadb.PersistentClient(path=vs_cfg["persist_directory"])
+        return client.get_collection(name=vs_cfg["collection_name_chroma"])
+
+    def _rows(self, hits):
+        # vector stores return row keys; rows missing from the metadata are skipped
+        results = []
+        for key, score in hits:
+            row = self.metadata.get_by_key(key)
+            if row is not None:
+                results.append({**row, "similarity_score": float(score)})
+        return results
+
+    # each _search_* takes a (n, dim) block of query vectors and returns one [(key, score)] list per row
+    def _search_faiss(self, target, query_vectors, top_k):
+        index, vectors = target
+        if vectors is None:
+            distances, keys = search_index(index, query_vectors, top_k)
+            return [
+                [(int(k), d) for k, d in zip(row_keys, row_distances) if k != -1]
+                for row_keys, row_distances in zip(keys, distances)
+            ]
+
+        # scan the compact codes for extra candidates, then re-rank them exactly
+        factor = get_faiss_config(self.config).get("rerank_factor", 4)
+        _, keys = search_index(index, query_vectors, top_k * factor)
+        return [rerank(q, row_keys, vectors, top_k) for q, row_keys in zip(query_vectors, keys)]
+
+    def _search_pinecone(self, target, query_vectors, top_k):
+        index, namespace = target
+        # the Pinecone query API takes one vector per call
+        results = []
+        for query_vector in query_vectors:
+            response = index.query(
+                vector=query_vector.tolist(),
+                top_k=top_k,
+                include=["metadata", "score"],
+                namespace=namespace
+            )
+            results.append([
+                (int(match['id'].split('-')[-1]), match["score"])
+                for match in response['matches']
+            ])
+        return results
+
+    def _search_chromadb(self, collection, query_vectors, top_k):
+        results = collection.query(
+            query_embeddings=[v.tolist() for v in query_vectors],
+            n_results=top_k,
+            include=["metadatas", "distances"]
+        )
+        return [
+            [(int(i.split("_")[1]), distance) for i, distance in zip(ids, distances)]
+            for ids, distances in zip(results["ids"], results["distances"])
+        ]
+
+    def _search_target(self, target, query_vectors, top_k):
+        if self.store_type == "faiss":
+            return self._search_faiss(target, query_vectors, top_k)
+        elif self.store_type == "pinecone":
+            return self._search_pinecone(target, query_vectors, top_k)
+        return self._search_chromadb(target, query_vectors, top_k)
+
+    # One encoder forward pass and one search per store for many queries; returns,
+    # per query, one hit list per store. Every trace in the batch is charged the
+    # time of the shared encode and search.
+    def _dense_search(self, queries, top_k, traces):
+        texts = list(queries)
+        if self.sql_target is not None:
+            texts += [sql_skeleton(q) for q in queries]
 
-    # save the metadata
-    df = get_data(config_path)
-    with open(metadata_path, "wb") as f:
-        pickle.dump(df.to_dict("records"), f)
-        
-    metadata = load_metadata_from_pickle(metadata_path)
-
-    # 2. Load embedding model
-    model = SentenceTransformer(config["embedding_model"])
-    query_vector = model.encode([query])[0]  # Shape: (dim,)
-
-    # 3. Connect to ChromaDB
-    persist_dir = config["vector_store"]["persist_directory"]
-    collection_name = config["vector_store"]["collection_name_chroma"]
-    client = chromadb.PersistentClient(path=persist_dir)
-    collection = client.get_collection(name=collection_name)
-
-    # 4. Query Chroma
-    results = collection.query(
-        query_embeddings=[query_vector],
-        n_results=top_k,
-        include=["metadatas", "distances"]
-    )
-
-    # 5. Construct result similar to FAISS format
-    retrieved_results = []
-    for i, distance in zip(results["ids"][0], results["distances"][0]):
-        index = int(i.split("_")[1])
-        data = metadata[index]
-        data["similarity_score"] = float(distance)
-        retrieved_results.append(data)
-
-    return retrieved_results
+        start = time.perf_counter()
+        query_vectors = self.embedder.encode_queries(texts)
+        for trace in traces:
+            trace.since("embedding", start)
+
+        start = time.perf_counter()
+        n = len(queries)
+        results = [self._search_target(self.target, query_vectors[:n], top_k)]
+        if self.sql_target is not None:
+            results.append(self._search_target(self.sql_target, query_vectors[n:], top_k))
+        for trace in traces:
+            trace.since("vector_search", start)
+        return [list(per_query) for per_query in zip(*results)]
+
+    def _fuse(self, hit_lists, top_k):
+        if len(hit_lists) == 1:
+            return hit_lists[0][:top_k]
+        return reciprocal_rank_fusion(hit_lists, k=self.lexical_cfg.get("rrf_k", 60))[:top_k]
+
+    def _lexical_search(self, query, trace):
+        start = time.perf_counter()
+        hits, coverage = self.lexical.search(query, max(self.lexical_cfg.get("candidates", 20), self.top_k))
+        if trace is not None:
+            trace.since("lexical_search", start)
+        short_cfg = self.lexical_cfg.get("short_circuit", {})
+        confident = short_cfg.get("enable", True) and self.lexical.is_confident(
+            hits, coverage, short_cfg.get("min_coverage", 1.0), short_cfg.get("margin", 2.0)
+        )
+        return hits, confident
+
+    # traces line up with queries (None where a caller did not pass one)
+    def search_batch(self, queries, top_k=None, traces=None):
+        if top_k is None:
+            top_k = self.top_k
+        if not queries:
+            return []
+        traces = list(traces or [None] * len(queries))
+        self.refresh()
+
+        # fused lists are cut to top_k only after merging
+        candidates = top_k
+        if self.lexical is not None or self.sql_target is not None:
+            candidates = max(top_k, self.lexical_cfg.get("candidates", 20), self.sql_cfg.get("candidates", 20))
+
+        if self.lexical is None:
+            dense = self._dense_search(queries, candidates, [t for t in traces if t is not None])
+            return [self._rows(self._fuse(hit_lists, top_k)) for hit_lists in dense]
+
+        # BM25 first: a confident lexical match skips the embedding step entirely
+        lexical = [self._lexical_search(q, t) for q, t in zip(queries, traces)]
+        pending = [i for i, (_, confident) in enumerate(lexical) if not confident]
+        dense = {}
+        if pending:
+            results = self._dense_search(
+                [queries[i] for i in pending], candidates, [traces[i] for i in pending if traces[i] is not None]
+            )
+            dense = dict(zip(pending, results))
+
+        fused = []
+        for i, (lexical_hits, confident) in enumerate(lexical):
+            if confident:
+                hits = lexical_hits[:top_k]
+            else:
+                hits = self._fuse(dense[i] + [lexical_hits], top_k)
+            fused.append(self._rows(hits))
+        return fused
+
+    def _search_coalesced(self, items):
+        # callers may ask for different top_k: search the largest and trim
+        top_k = max(k for _, k, _ in items)
+        results = self.search_batch([q for q, _, _ in items], top_k, [t for _, _, t in items])
+        return [rows[:k] for rows, (_, k, _) in zip(results, items)]
+
+    # Concurrent search() calls arriving within max_wait_ms share one batch
+    def enable_batching(self, max_batch=32, max_wait_ms=5):
+        if self._batcher is None:
+            self._batcher = MicroBatcher(self._search_coalesced, max_batch, max_wait_ms)
+
+    def search(self, query, top_k=None, trace=None):
+        if top_k is None:
+            top_k = self.top_k
+        if self._batcher is not None:
+            return self._batcher.submit((query, top_k, trace))
+        return self.search_batch([query], top_k, [trace])[0]
+
+# one resident retriever per config file
+_retrievers = {}
+
+def get_retriever(config_path="params.yaml"):
+    if config_path not in _retrievers:
+        _retrievers[config_path] = Retriever(read_param(config_path), config_path)
+    return _retrievers[config_path]
 
 def get_similar_context(query, config_path="params.yaml", top_k=None):
-    config = read_param(config_path)
-    store_type = config["vector_store"]["type"].lower()
-
-    if top_k is None:
-        top_k = config["vector_store"]["top_k"]
-
-    if store_type == "faiss":
-        return retrieve_from_faiss(query, config,config_path, top_k)
-    elif store_type == "pinecone":
-        return retrieve_from_pinecone(query, config,config_path, top_k)
-    elif store_type == "chromadb":
-        return retrieve_from_chromadb(query, config,config_path, top_k)
-    else:
-        raise ValueError(f"Unsupported vector store type: {store_type}")
+    return get_retriever(config_path).search(query, top_k)
 
 
 if __name__ == "__main__":
@@ -156,4 +317,4 @@ if __name__ == "__main__":
         print("⚠️ No results found.")
     else:
         print("✅ Top results:\n")
-        print(results,"\n\n")
\ No newline at end of file
+        print(results,"\n\n")
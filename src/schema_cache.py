@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from db_schema_utils import create_connection, extract_schema_tables, format_schema, read_change_markers
+
+class SchemaCache:
+    """
+    Keeps one schema snapshot per database on disk and serves it without
+    touching the database. The snapshot is refreshed on a background thread
+    when the TTL expires or the information_schema change markers move.
+    """
+
+    def __init__(self, db_cfg, cache_dir="data/schema_cache", ttl_seconds=3600, check_interval_seconds=60, on_refresh=None):
+        self.db_cfg = db_cfg
+        self.on_refresh = on_refresh
+        self.ttl_seconds = ttl_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.engine = create_connection(db_cfg)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        db_id = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{db_cfg['type']}_{db_cfg.get('host', '')}_{db_cfg.get('port', '')}_{db_cfg['name']}")
+        self.path = os.path.join(cache_dir, f"{db_id}.json")
+
+        self.snapshot = self._load()
+        self._set_tables(self.snapshot["tables"] if self.snapshot else [])
+        if self.snapshot and on_refresh:
+            on_refresh(self.snapshot["tables"])
+        self._last_check = time.time()
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable schema cache {self.path}: {e}")
+            return None
+        # snapshots from older versions only carried the rendered text
+        return snapshot if "tables" in snapshot else None
+
+    def _set_tables(self, tables):
+        self._context = format_schema(tables)
+        # schema version used to key downstream caches
+        self.fingerprint = hashlib.sha1(json.dumps(tables, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _save(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, force=False):
+        """Re-extract the schema if forced, expired or the change markers moved."""
+        markers = read_change_markers(self.engine, self.db_cfg["type"])
+        snapshot = self.snapshot
+        expired = snapshot is None or time.time() - snapshot["fetched_at"] > self.ttl_seconds
+        if not force and not expired and markers == snapshot.get("markers"):
+            return False
+
+        start = time.time()
+        tables = extract_schema_tables(
+            self.engine,
+            sample_rows=self.db_cfg.get("sample_rows", 2),
+            workers=self.db_cfg.get("sample_workers", 4)
+        )
+        self.snapshot = {"markers": markers, "fetched_at": time.time(), "tables": tables}
+        self._set_tables(tables)
+        self._save(self.snapshot)
+        print(f"🔄 Schema cache refreshed in {time.time() - start:.2f}s ({len(tables)} tables)")
+        if self.on_refresh:
+            self.on_refresh(tables)
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] Schema refresh failed—keeping cached schema. ({e})")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def start(self):
+        """Warm the cache at startup without blocking the caller."""
+        self._refresh_in_background()
+        return self
+
+    def get(self):
+        """Return the full cached schema context immediately, scheduling a refresh if due."""
+        now = time.time()
+        expired = self.snapshot is None or now - self.snapshot["fetched_at"] > self.ttl_seconds
+        if expired or now - self._last_check > self.check_interval_seconds:
+            self._last_check = now
+            self._refresh_in_background()
+        return self._context
+
+    def get_tables(self):
+        self.get()
+        return self.snapshot["tables"] if self.snapshot else []
@@ -0,0 +1,87 @@
+import re
+import numpy as np
+from db_schema_utils import format_table
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# identifiers that say nothing about which table is meant
+SQL_KEYWORDS = {
+    "select", "from", "where", "and", "or", "not", "in", "is", "null", "as", "on",
+    "join", "left", "right", "inner", "outer", "full", "cross", "group", "by",
+    "order", "having", "limit", "offset", "union", "all", "distinct", "insert",
+    "into", "values", "update", "set", "delete", "create", "table", "drop",
+    "alter", "with", "case", "when", "then", "else", "end", "asc", "desc",
+    "like", "between", "exists", "count", "sum", "avg", "min", "max",
+}
+
+def fragment_identifiers(user_input):
+    return {tok.lower() for tok in IDENTIFIER_RE.findall(user_input)} - SQL_KEYWORDS
+
+# text embedded per table: name, comment and column names/comments
+def table_document(table):
+    columns = []
+    for name, _, *rest in table["columns"]:
+        comment = rest[0] if rest else ""
+        columns.append(f"{name} ({comment})" if comment else name)
+    parts = [table["name"], table.get("comment") or "", "columns: " + ", ".join(columns)]
+    # split snake_case so the encoder sees words
+    return ". ".join(p for p in parts if p).replace("_", " ")
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class SchemaIndex:
+    """
+    Ranks tables against a SQL fragment by embedding similarity of each
+    table's name, columns and comments plus a lexical match on identifiers.
+    """
+
+    def __init__(self, tables, embedder):
+        self.tables = tables
+        self.embedder = embedder
+        self.blocks = [format_table(t) for t in tables]
+        self.table_names = [t["name"].lower() for t in tables]
+        self.column_sets = [{c[0].lower() for c in t["columns"]} for t in tables]
+        self.vectors = _normalize(embedder.encode([table_document(t) for t in tables])) if tables else None
+
+    def lexical_scores(self, identifiers):
+        scores = np.zeros(len(self.tables), dtype=np.float32)
+        if not identifiers:
+            return scores
+        for i, (name, columns) in enumerate(zip(self.table_names, self.column_sets)):
+            if name in identifiers:
+                scores[i] += 1.0
+            scores[i] += 0.5 * len(identifiers & columns) / len(identifiers)
+        return scores
+
+    def rank(self, user_input, lexical_weight=1.0):
+        query = _normalize(self.embedder.encode_query(user_input))[0]
+        scores = self.vectors @ query + lexical_weight * self.lexical_scores(fragment_identifiers(user_input))
+        return np.argsort(-scores, kind="stable")
+
+    def select(self, user_input, top_n, lexical_weight=1.0):
+        if not self.tables:
+            return ""
+        if not top_n or len(self.tables) <= top_n:
+            return "\n".join(self.blocks)
+        top = self.rank(user_input, lexical_weight)[:top_n]
+        return "\n".join(self.blocks[i] for i in top)
+
+class SchemaSelector:
+    """Holds the current SchemaIndex and swaps in a new one whenever the schema cache refreshes."""
+
+    def __init__(self, embedder, top_n=8, lexical_weight=1.0):
+        self.embedder = embedder
+        self.top_n = top_n
+        self.lexical_weight = lexical_weight
+        self.index = None
+
+    def update(self, tables):
+        # built off to the side, then swapped in with a single assignment
+        self.index = SchemaIndex(tables, self.embedder)
+
+    def select(self, user_input):
+        index = self.index
+        return index.select(user_input, self.top_n, self.lexical_weight) if index else ""
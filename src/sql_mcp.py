@@ -9,58 +9,54 @@ import time
 import pygetwindow as gw
 import yaml
 import argparse
-from llm import query_groq_llama
-from retrieve_context import get_similar_context
-import datetime
-import csv
-import time
-from db_schema_utils import read_db_config, create_connection, extract_schema_with_examples
+import queue
+import threading
+from contextlib import contextmanager
+from db_schema_utils import read_db_config
+from suggestion_client import SuggestionClient
+from suggestion_pipeline import ERROR_SUGGESTION, SuggestionCancelled, SuggestionPipeline
+from timing import LatencyStats, RequestTrace
+from event_log import EventLog
 
 # Set working directory to where the executable was bundled
 if getattr(sys, 'frozen', False):
     os.chdir(sys._MEIPASS if hasattr(sys, '_MEIPASS') else os.path.dirname(sys.executable))
 
+GHOST_PREFIX = "/* suggestion: "
+GHOST_SUFFIX = " */"
+
 ghost_displayed = False
 ghost_text = ""
 last_suggestion = ""
-session_memory = []
-
-def log_suggestion(user_input, retrieved_context, suggestion, status, latency_ms, db_schema):
-    os.makedirs("logs", exist_ok=True)
-    log_path = "logs/suggestions_log.csv"
-    file_exists = os.path.isfile(log_path)
-
-    with open(log_path, "a", encoding="utf-8", newline='') as csvfile:
-        writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
-
-        # Write headers if file doesn't exist
-        if not file_exists:
-            writer.writerow([
-                "timestamp",
-                "model",
-                "status",
-                "user_input",
-                "retrieved_context",
-                "db_name",
-                "db_schema",        
-                "llm_suggestion",
-                "latency_ms"
-            ])
-
-        db_name     = config["db"]["name"]
-        schema_snip = db_schema.replace('\n', '\\n')[:200]
-        writer.writerow([
-            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            config['llm']['model_name'],
-            status,
-            user_input.replace('\n', '\\n'),
-            retrieved_context.replace('\n', '\\n'),
-            db_name,           # ← new field
-            schema_snip,       # ← new field
-            suggestion.replace('\n', '\\n'),
-            latency_ms
-        ])
-        
+engine = None            # local SuggestionEngine, or
+client = None            # SuggestionClient for a shared suggestion server
+pipeline = None
+event_log = None
+streaming_request = None
+quit_event = threading.Event()
+typing_event = threading.Event()   # set while we type into the editor ourselves
+typing_until = 0.0
+# synthetic keystrokes can reach the keyboard hooks shortly after pyautogui returns
+TYPING_ECHO_S = 0.2
+latency_stats = LatencyStats()
+LATENCY_SUMMARY_PATH = "logs/latency_summary.json"
+
+def log_suggestion(user_input, retrieved_context, suggestion, status, latency_ms, db_schema, stages=None):
+    # Only enqueues; the event log writes from its own thread
+    event_log.append({
+        "model": config["llm"]["model_name"],
+        "embedding_model": config["embedding_model"],
+        "vector_store": config["vector_store"]["type"],
+        "status": status,
+        "user_input": user_input,
+        "retrieved_context": retrieved_context,
+        "db_name": config["db"]["name"],
+        "db_schema": db_schema[:200],
+        "llm_suggestion": suggestion,
+        "latency_ms": latency_ms,
+        **{f"{stage}_ms": ms for stage, ms in (stages or {}).items()}
+    })
+
 def read_param(config_path):
     with open(config_path) as yaml_file:
         return yaml.safe_load(yaml_file)
@@ -71,79 +67,34 @@ def get_active_window_title():
     except:
         return ""
 
-def format_context(rows):
-    """
-    Takes in metadata rows and builds a richer LLM context string,
-    including similarity scores.
-    """
-    context_blocks = []
-    for row in rows:
-        block = f"""Prompt: {row['sql_prompt']}
-            SQL: {row.get('sql', 'N/A')}
-            Explanation: {row.get('sql_explanation', 'N/A')}
-            Similarity Score: {row.get('similarity_score', 'N/A'):.4f}"""
-        context_blocks.append(block)
-    return "\n\n".join(context_blocks)
-
-def get_real_suggestion(user_input, config):
+# Suggestions come from the shared server when one is configured, otherwise from the local engine
+def get_real_suggestion(user_input, config, on_token=None, request=None, trace=None):
+    if engine is not None:
+        return engine.get_real_suggestion(user_input, on_token=on_token, request=request, trace=trace)
     try:
-        # Try to load user DB schema
-        try:
-            db_cfg = read_db_config()
-            engine = create_connection(db_cfg)
-            db_schema_context = extract_schema_with_examples(
-                engine,
-                db_cfg["name"],
-                sample_rows=db_cfg.get("sample_rows", 2)
-            )
-            # cache it for later
-            get_real_suggestion._cached_schema = db_schema_context
-        except Exception as db_err:
-            print(f"[WARN] DB schema load failed—using cached or empty. ({db_err})")
-            db_schema_context = getattr(get_real_suggestion, "_cached_schema", "")
-
-        # Retrieve similar context rows and format them
-        similar_rows = get_similar_context(
-            user_input,
-            config_path="params.yaml",
-            top_k=config["vector_store"]["top_k"]
-        )
-        rag_context = format_context(similar_rows)
-
-        # Include session memory if enabled
-        if config.get("memory", {}).get("enable", False):
-            limit = config["memory"].get("limit", 3)
-            session_context = "\n\n".join(session_memory[-limit:])
-        else:
-            session_context = ""
-            
-        # Build full LLM prompt context
-        parts = [db_schema_context, session_context, rag_context]
-        full_context = "\n\n".join([p for p in parts if p]).strip()
-        
-        # Call LLM
-        response = query_groq_llama(
-            user_input=user_input,
-            context=full_context,
-            config=config
-        )
-
-        # Append to session memory if enabled
-        if config.get("memory", {}).get("enable", False):
-            session_memory.append(f"Prompt: {user_input}\nResponse: {response}")
-
-        return response, rag_context, db_schema_context
-    
+        return client.complete(user_input, on_token=on_token, request=request, trace=trace)
+    except SuggestionCancelled:
+        raise
     except Exception as e:
-        print(f"[ERROR] Failed to get suggestion: {e}")
-        return "(error generating suggestion)", "", ""
+        print(f"[ERROR] Suggestion server request failed: {e}")
+        return ERROR_SUGGESTION, "", ""
 
-def handle_ctrl_c():
-    global ghost_displayed, ghost_text, config, last_suggestion, copied_text, context, latency_ms, db_schema_context
+def clear_session_memory():
+    if engine is not None:
+        engine.clear_memory()
+    else:
+        client.clear_memory()
+    print("🧹 Session memory cleared")
+
+# Worker thread: capture the fragment, build the suggestion and post events for rendering
+def run_suggestion(request, emit):
+    trace = request.payload
 
     # Waiting text to get added in clipboard
-    time.sleep(config["base"]["sleep_time"])
-    copied_text = pyperclip.paste().strip()
+    with trace.span("clipboard_wait"):
+        time.sleep(config["base"]["sleep_time"])
+        request.check()
+        copied_text = pyperclip.paste().strip()
 
     # Getting the current active window
     active_window = get_active_window_title()
@@ -162,30 +113,117 @@ def handle_ctrl_c():
         print("⚠️ Clipboard is empty.")
         return
 
+    # In streaming mode each clean SQL piece is posted as it arrives
+    on_token = (lambda piece: emit("token", (piece, trace))) if config["llm"].get("stream", False) else None
+
     # Get suggestion and context from LLM
-    start_time = time.time()
-    suggestion, context, db_schema_context = get_real_suggestion(copied_text, config)
-    end_time = time.time()
-    latency_ms = (end_time - start_time)
-    last_suggestion = suggestion
+    suggestion, context, db_schema_context = get_real_suggestion(
+        copied_text, config, on_token=on_token, request=request, trace=trace
+    )
+
+    emit("done", {
+        "copied_text": copied_text,
+        "suggestion": suggestion,
+        "context": context,
+        "db_schema_context": db_schema_context,
+        "trace": trace
+    })
+
+# Our own pyautogui keystrokes reach the same keyboard hooks (on Windows only
+# VK_PACKET events are skipped), so the hooks ignore keys while we type
+@contextmanager
+def app_typing():
+    global typing_until
+    typing_event.set()
+    try:
+        yield
+    finally:
+        typing_until = time.monotonic() + TYPING_ECHO_S
+        typing_event.clear()
 
-    # Show ghost suggestion as a comment
-    ghost_text = f"/* suggestion: {suggestion} */"
+def is_app_typing():
+    return typing_event.is_set() or time.monotonic() < typing_until
+
+def open_ghost():
     pyautogui.press('right')
     pyautogui.press('enter')
-    pyautogui.write(ghost_text, interval=config["triggers"]["speed_write"])
-    ghost_displayed = True
+    pyautogui.write(GHOST_PREFIX, interval=config["triggers"]["speed_write"])
+
+# Keyboard hook callbacks only enqueue; all typing happens on the main thread
+def handle_ctrl_c():
+    # the trace starts at the hotkey so queueing time is part of the latency
+    pipeline.submit(RequestTrace())
 
 def handle_tab():
-    global ghost_displayed, ghost_text, last_suggestion, copied_text, context, config, latency_ms, db_schema_context
+    if ghost_displayed and not is_app_typing():
+        pipeline.post("accept")
+
+def handle_any_other_key(e):
+    if is_app_typing():
+        return
+    if ghost_displayed or streaming_request is not None:
+        pipeline.post("dismiss")
+
+def render_token(request_id, piece, trace):
+    global streaming_request
+
+    with trace.span("typing"), app_typing():
+        # The ghost comment opens on the first clean SQL token
+        if streaming_request != request_id:
+            open_ghost()
+            streaming_request = request_id
+        pyautogui.write(piece, interval=config["triggers"]["speed_write"])
+
+def remove_ghost():
+    pyautogui.hotkey(config["triggers"]["remove_ghost"]["c"],
+                     config["triggers"]["remove_ghost"]["key"])
+
+def render_suggestion(request_id, result):
+    global ghost_displayed, ghost_text, last_suggestion, copied_text, context, latency_ms, stages, db_schema_context, streaming_request
+
+    # A failed request is never offered for Tab; a half-streamed ghost is removed
+    if result["suggestion"] == ERROR_SUGGESTION:
+        print("⚠️ No suggestion: generation failed.")
+        if streaming_request == request_id:
+            with app_typing():
+                remove_ghost()
+            streaming_request = None
+        return
+
+    copied_text = result["copied_text"]
+    context = result["context"]
+    db_schema_context = result["db_schema_context"]
+    last_suggestion = result["suggestion"]
+    trace = result["trace"]
+
+    # Show ghost suggestion as a comment
+    ghost_text = f"{GHOST_PREFIX}{last_suggestion}{GHOST_SUFFIX}"
+    with trace.span("typing"), app_typing():
+        if streaming_request == request_id:
+            pyautogui.write(GHOST_SUFFIX, interval=config["triggers"]["speed_write"])
+        else:
+            open_ghost()
+            pyautogui.write(f"{last_suggestion}{GHOST_SUFFIX}", interval=config["triggers"]["speed_write"])
+    streaming_request = None
+    ghost_displayed = True
+
+    # End-to-end: hotkey pressed until the ghost text is fully typed
+    latency_ms = round(trace.elapsed_ms(), 2)
+    stages = trace.as_dict()
+    latency_stats.add(trace, latency_ms)
+    latency_stats.save(LATENCY_SUMMARY_PATH)
+
+def accept_suggestion():
+    global ghost_displayed
 
     if ghost_displayed:
-        # Remove ghost suggestion
-        pyautogui.hotkey('ctrl', 'z')
-        pyautogui.press('enter')
+        with app_typing():
+            # Remove ghost suggestion
+            pyautogui.hotkey('ctrl', 'z')
+            pyautogui.press('enter')
 
-        # Insert actual suggestion
-        pyautogui.write(last_suggestion, interval = config["triggers"]["speed_write"])
+            # Insert actual suggestion
+            pyautogui.write(last_suggestion, interval = config["triggers"]["speed_write"])
 
         # Log the accepted suggestion
         log_suggestion(
@@ -194,19 +232,20 @@ def handle_tab():
             suggestion=last_suggestion,
             status="ACCEPTED",
             latency_ms=latency_ms,
-            db_schema=db_schema_context
+            db_schema=db_schema_context,
+            stages=stages
         )
         ghost_displayed = False
 
-def handle_any_other_key(e):
-    global ghost_displayed, copied_text, context, last_suggestion, config, db_schema_context
+def dismiss_suggestion():
+    global ghost_displayed, streaming_request
 
     if ghost_displayed:
         print("🚫 Suggestion dismissed.")
 
         # Remove ghost suggestion
-        pyautogui.hotkey(config["triggers"]["remove_ghost"]["c"],
-                         config["triggers"]["remove_ghost"]["key"])
+        with app_typing():
+            remove_ghost()
 
         # Log as dismissed
         log_suggestion(
@@ -214,30 +253,83 @@ def handle_any_other_key(e):
             retrieved_context=context,
             suggestion=last_suggestion,
             status="DISMISSED",
-            latency_ms=0,
-            db_schema=db_schema_context
+            latency_ms=latency_ms,
+            db_schema=db_schema_context,
+            stages=stages
         )
         ghost_displayed = False
+    elif streaming_request is not None:
+        # Typing over a half-rendered ghost cancels it
+        pipeline.cancel(streaming_request)
+        with app_typing():
+            remove_ghost()
+        streaming_request = None
+
+# Main thread: apply UI actions and results of the current request in order
+def render_loop():
+    while not quit_event.is_set():
+        try:
+            kind, request_id, data = pipeline.events.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        if kind == "accept":
+            accept_suggestion()
+        elif kind == "dismiss":
+            dismiss_suggestion()
+        elif not pipeline.is_current(request_id):
+            continue  # result of a superseded request
+        elif kind == "token":
+            piece, trace = data
+            render_token(request_id, piece, trace)
+        elif kind == "done":
+            render_suggestion(request_id, data)
 
 def main(config_path):
     print("👀 Listening for Ctrl+C and Tab... (press Esc to quit)")
-    global config
+    global config, engine, client, pipeline, event_log
 
     config = read_param(config_path)
     config["db"] = read_db_config()
 
-    # We don’t need to load FAISS or metadata here — handled in retrieve_context
+    log_cfg = config.get("event_log", {})
+    event_log = EventLog(
+        log_cfg.get("dir", "logs/events"),
+        max_segment_bytes=log_cfg.get("max_segment_mb", 16) * 1024 * 1024,
+        flush_interval_s=log_cfg.get("flush_interval_s", 1.0)
+    )
+
+    # Either call a warm suggestion server or load the engine in this process
+    server_url = config.get("server", {}).get("url")
+    if server_url:
+        client = SuggestionClient(server_url, config)
+        print(f"🔌 Using suggestion server at {server_url}")
+    else:
+        # imported here so a thin client never loads the model, index or torch
+        from suggestion_engine import SuggestionEngine
+        engine = SuggestionEngine(config, config_path, db_cfg=config["db"])
+
+    # Suggestions are built on worker threads; the hotkey only enqueues
+    pipeline = SuggestionPipeline(run_suggestion, workers=config.get("pipeline", {}).get("workers", 2))
+
     keyboard.add_hotkey(config["triggers"]["initiater"], handle_ctrl_c)
     keyboard.add_hotkey(config["triggers"]["filler"], handle_tab)
 
     # Add memory reset hotkey
-    keyboard.add_hotkey("ctrl+shift+c", lambda: (session_memory.clear(), print("🧹 Session memory cleared")))
+    keyboard.add_hotkey("ctrl+shift+c", clear_session_memory)
 
     for key in [chr(i) for i in range(32, 127)]:
         if key != config["triggers"]["key"]:
             keyboard.on_press_key(key, handle_any_other_key, suppress=False)
 
-    keyboard.wait(config["triggers"]["quiting"])
+    keyboard.add_hotkey(config["triggers"]["quiting"], quit_event.set)
+    render_loop()
+    event_log.close()
+
+    # Per-stage latency percentiles for this session
+    print("\n⏱️ Stage latency (ms):")
+    for stage, stats in latency_stats.summary().items():
+        print(f"  - {stage}: p50 {stats['p50']}  p95 {stats['p95']}  p99 {stats['p99']}  (n={stats['count']})")
 
 if __name__ == "__main__":
     args = argparse.ArgumentParser()
@@ -0,0 +1,43 @@
+import re
+
+# literals and comments say nothing about the shape of a query
+COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?(\*/|$)", re.DOTALL)
+# single quotes are string literals; double quotes delimit identifiers ("Orders")
+QUOTED_RE = re.compile(r"'(?:[^']|'')*'?|\"((?:[^\"]|\"\")*)\"?")
+NUMBER_RE = re.compile(r"(?<![A-Za-z0-9_])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?(?![A-Za-z0-9_])", re.IGNORECASE)
+# operators, commas and parentheses become tokens of their own: id=5 and id = 3 share a skeleton
+PUNCT_RE = re.compile(r"(<=|>=|<>|!=|\|\||::|[=<>(),+*/%-])")
+PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+SPACE_RE = re.compile(r"\s+")
+
+# bump when sql_skeleton changes, so stores and corpora derived from it are rebuilt
+SKELETON_VERSION = 2
+
+def _unquote(match):
+    identifier = match.group(1)
+    return "?" if identifier is None else identifier.replace('""', '"')
+
+def sql_skeleton(sql):
+    """
+    Literal-stripped, lower-cased form of a SQL statement or partial fragment:
+    comments removed, strings and numbers replaced by ?, quoted identifiers
+    unquoted, operators and punctuation spaced out, IN-lists collapsed and
+    whitespace squeezed, so only keywords, identifiers and structure remain.
+    """
+    if not isinstance(sql, str):
+        return ""
+    text = COMMENT_RE.sub(" ", sql)
+    text = QUOTED_RE.sub(_unquote, text)
+    text = NUMBER_RE.sub("?", text)
+    text = PUNCT_RE.sub(r" \1 ", text)
+    text = PLACEHOLDER_LIST_RE.sub("( ? )", text)
+    return SPACE_RE.sub(" ", text).strip().rstrip(";").strip().lower()
+
+def sql_literals(sql):
+    """String and number literals of a SQL fragment, in order of appearance."""
+    if not isinstance(sql, str):
+        return []
+    text = COMMENT_RE.sub(" ", sql)
+    strings = [m.group(0) for m in QUOTED_RE.finditer(text) if m.group(1) is None]
+    numbers = [m.group(0) for m in NUMBER_RE.finditer(QUOTED_RE.sub(" ", text))]
+    return strings + numbers
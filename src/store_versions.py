@@ -0,0 +1,55 @@
+import os
+import shutil
+import time
+
+# Directory stores are never written in place: readers keep their files
+# memory-mapped, and truncating a mapped file kills the reading process.
+# Each build writes a complete new version and then swaps a pointer file.
+#   <store>/CURRENT     name of the live version directory
+#   <store>/v<ns>/      one complete copy of the store
+# A store directory without CURRENT is an older, unversioned store.
+CURRENT_FILE = "CURRENT"
+
+def current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+# the directory holding the live files of a store
+def store_dir(path):
+    version = current_version(path)
+    return os.path.join(path, version) if version else path
+
+def new_version_dir(path):
+    version_dir = os.path.join(path, f"v{time.time_ns()}")
+    os.makedirs(version_dir)
+    return version_dir
+
+def publish_version(path, version_dir):
+    """Point CURRENT at a fully written version and drop the versions it replaces."""
+    version = os.path.basename(version_dir)
+    tmp_path = os.path.join(path, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILE))
+
+    # Unlinking a mapped file is safe on POSIX; where the OS refuses (Windows),
+    # the leftover is removed by a later build
+    for entry in os.listdir(path):
+        if entry in (CURRENT_FILE, version):
+            continue
+        entry_path = os.path.join(path, entry)
+        try:
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+            else:
+                os.remove(entry_path)
+        except OSError:
+            pass
+
+def discard_version(version_dir):
+    shutil.rmtree(version_dir, ignore_errors=True)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from embeddings import normalize_fragment
+from sql_normalize import sql_literals
+
+# per-query similarity scores in the formatted context (see format_context)
+SCORE_RE = re.compile(r"Similarity Score: [^\n]*")
+
+def _sha(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class SuggestionCache:
+    """
+    Persistent LLM suggestion cache in SQLite.
+
+    Exact tier: hash of the normalized input, schema fingerprint, model name and
+    retrieved context. Optional semantic tier: nearest cached input (cosine on
+    query embeddings) under the same schema and model, above a threshold, and
+    only among entries with the same literals and retrieved context.
+    Entries expire after ttl_seconds and the least recently used are evicted
+    beyond max_entries. Rows from an older schema are dropped on the next write.
+    """
+
+    def __init__(self, path, model_name, embedder=None, max_entries=5000, ttl_seconds=7 * 24 * 3600, semantic_threshold=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.model_name = model_name
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold if embedder is not None else None
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS suggestions (
+            key TEXT PRIMARY KEY,
+            schema_fp TEXT NOT NULL,
+            model TEXT NOT NULL,
+            embedding BLOB,
+            suggestion TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_scope ON suggestions(schema_fp, model)")
+        # caches created before the semantic guard existed; their rows only serve exact hits
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(suggestions)")]
+        if "guard" not in columns:
+            self._conn.execute("ALTER TABLE suggestions ADD COLUMN guard TEXT")
+        self._conn.commit()
+
+        # in-memory mirror of the semantic tier for the current scope
+        self._scope = None
+        self._keys = []
+        self._guards = np.array([], dtype=object)
+        self._vectors = None
+
+    def _exact_key(self, user_input, schema_fp, context):
+        return _sha(normalize_fragment(user_input), schema_fp, self.model_name, _sha(context))
+
+    # a near hit may differ in wording or formatting, never in values or examples;
+    # scores differ for every input, so only the retrieved rows themselves count
+    def _guard(self, user_input, context):
+        return _sha(*sql_literals(user_input), _sha(SCORE_RE.sub("", context)))
+
+    def _query_vector(self, user_input):
+        vector = np.asarray(self.embedder.encode_query(user_input)[0], dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _load_scope(self, schema_fp):
+        if self._scope == schema_fp:
+            return
+        rows = self._conn.execute(
+            "SELECT key, guard, embedding FROM suggestions WHERE schema_fp = ? AND model = ? AND embedding IS NOT NULL",
+            (schema_fp, self.model_name)
+        ).fetchall()
+        self._scope = schema_fp
+        self._keys = [key for key, _, _ in rows]
+        self._guards = np.array([guard for _, guard, _ in rows], dtype=object)
+        self._vectors = np.stack([np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows]) if rows else None
+
+    def _touch(self, key, now):
+        row = self._conn.execute(
+            "SELECT suggestion, created_at FROM suggestions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        self._conn.execute("UPDATE suggestions SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0]
+
+    def get(self, user_input, schema_fp, context=""):
+        now = time.time()
+        with self._lock:
+            hit = self._touch(self._exact_key(user_input, schema_fp, context), now)
+            if hit is not None or self.semantic_threshold is None:
+                return hit
+
+            self._load_scope(schema_fp)
+            if self._vectors is None:
+                return None
+            candidates = np.flatnonzero(self._guards == self._guard(user_input, context))
+            if not len(candidates):
+                return None
+            similarities = self._vectors[candidates] @ self._query_vector(user_input)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.semantic_threshold:
+                return None
+            return self._touch(self._keys[candidates[best]], now)
+
+    def put(self, user_input, schema_fp, context, suggestion):
+        now = time.time()
+        key = self._exact_key(user_input, schema_fp, context)
+        vector = self._query_vector(user_input) if self.semantic_threshold is not None else None
+        with self._lock:
+            # anything cached under an older schema can never be served again
+            self._conn.execute("DELETE FROM suggestions WHERE model = ? AND schema_fp != ?", (self.model_name, schema_fp))
+            self._conn.execute("DELETE FROM suggestions WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                """INSERT OR REPLACE INTO suggestions
+                       (key, schema_fp, model, embedding, suggestion, created_at, last_used, guard)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    key, schema_fp, self.model_name, vector.tobytes() if vector is not None else None,
+                    suggestion, now, now, self._guard(user_input, context)
+                )
+            )
+            self._conn.execute(
+                """DELETE FROM suggestions WHERE key IN (
+                       SELECT key FROM suggestions ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+            self._scope = None  # reload the semantic mirror on next miss
@@ -0,0 +1,56 @@
+import getpass
+import json
+import socket
+import uuid
+import requests
+
+# session memory on a shared server is keyed by this id, so each client
+# needs its own unless server.session_id pins one
+def default_session_id():
+    try:
+        return f"{getpass.getuser()}@{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    except Exception:
+        return uuid.uuid4().hex
+
+class SuggestionClient:
+    """Thin caller for the suggestion server; mirrors SuggestionEngine.get_real_suggestion."""
+
+    def __init__(self, base_url, config, session_id=None):
+        server_cfg = config.get("server", {})
+        self.base_url = base_url.rstrip("/")
+        self.session_id = server_cfg.get("session_id") or session_id or default_session_id()
+        self.timeout = (server_cfg.get("connect_timeout", 3.05), server_cfg.get("read_timeout", 60))
+        self.session = requests.Session()
+
+    # server-side stage timings are merged into the caller's trace
+    def complete(self, user_input, on_token=None, request=None, trace=None):
+        payload = {"user_input": user_input, "session_id": self.session_id}
+        if on_token is None:
+            response = self.session.post(f"{self.base_url}/complete", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+            if trace is not None:
+                trace.merge(result.get("stages"))
+            return result["suggestion"], result["retrieved_context"], result["db_schema"]
+
+        # Server-sent events: {"token": ...} pieces, then one {"done": true, ...}
+        with self.session.post(f"{self.base_url}/complete/stream", json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if request is not None:
+                    request.check()  # closing the stream tells the server to stop
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                if "token" in event:
+                    on_token(event["token"])
+                elif event.get("done"):
+                    if trace is not None:
+                        trace.merge(event.get("stages"))
+                    return event["suggestion"], event["retrieved_context"], event["db_schema"]
+        raise RuntimeError("suggestion stream ended without a result")
+
+    def clear_memory(self):
+        self.session.post(f"{self.base_url}/memory/clear", json={"session_id": self.session_id}, timeout=self.timeout)
@@ -0,0 +1,184 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from llm import query_groq_llama, stream_groq_llama
+from retrieve_context import get_retriever
+from db_schema_utils import read_db_config
+from schema_cache import SchemaCache
+from schema_index import SchemaSelector
+from embeddings import get_embedding_service
+from suggestion_cache import SuggestionCache
+from suggestion_pipeline import ERROR_SUGGESTION, SuggestionCancelled
+from timing import span
+
+def format_context(rows):
+    """
+    Takes in metadata rows and builds a richer LLM context string,
+    including similarity scores.
+    """
+    context_blocks = []
+    for row in rows:
+        block = f"""Prompt: {row['sql_prompt']}
+            SQL: {row.get('sql', 'N/A')}
+            Explanation: {row.get('sql_explanation', 'N/A')}
+            Similarity Score: {row.get('similarity_score', 'N/A'):.4f}"""
+        context_blocks.append(block)
+    return "\n\n".join(context_blocks)
+
+# Wait for a context source until its deadline, degrading to a fallback value
+def wait_for_source(name, future, deadline, fallback):
+    try:
+        return future.result(timeout=max(0.0, deadline - time.perf_counter()))
+    except FutureTimeout:
+        print(f"[WARN] {name} missed its deadline—continuing without waiting.")
+    except Exception as e:
+        print(f"[WARN] {name} failed—continuing without it. ({e})")
+    return fallback
+
+class SuggestionEngine:
+    """
+    Everything needed to turn a SQL fragment into a suggestion, loaded once:
+    retriever, schema cache and selector, suggestion cache and session memory.
+    Shared by the hotkey client and the HTTP suggestion server.
+    """
+
+    def __init__(self, config, config_path="params.yaml", db_cfg=None):
+        self.config = config
+        self.embedder = get_embedding_service(config)
+        self.session_memory = defaultdict(list)
+        self.last_schema_context = ""
+        self.schema_cache = None
+        self.suggestion_cache = None
+
+        # Context sources run side by side; a source that misses its deadline keeps running here
+        self.context_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="context")
+
+        # Persistent LLM response cache
+        sc_cfg = config.get("suggestion_cache", {})
+        if sc_cfg.get("enable", False):
+            self.suggestion_cache = SuggestionCache(
+                sc_cfg.get("path", "data/cache/suggestions.sqlite"),
+                config["llm"]["model_name"],
+                embedder=self.embedder,
+                max_entries=sc_cfg.get("max_entries", 5000),
+                ttl_seconds=sc_cfg.get("ttl_seconds", 7 * 24 * 3600),
+                semantic_threshold=sc_cfg.get("semantic_threshold")
+            )
+
+        # Schema snapshot is served from disk and refreshed off the request path
+        cache_cfg = config.get("schema_cache", {})
+        select_cfg = config.get("schema_context", {})
+        self.schema_selector = SchemaSelector(
+            self.embedder,
+            top_n=select_cfg.get("top_n", 8),
+            lexical_weight=select_cfg.get("lexical_weight", 1.0)
+        )
+        try:
+            self.schema_cache = SchemaCache(
+                db_cfg or read_db_config(),
+                cache_dir=cache_cfg.get("dir", "data/schema_cache"),
+                ttl_seconds=cache_cfg.get("ttl_seconds", 3600),
+                check_interval_seconds=cache_cfg.get("check_interval_seconds", 60),
+                on_refresh=self.schema_selector.update
+            ).start()
+        except Exception as db_err:
+            print(f"[WARN] DB schema cache unavailable—suggestions will run without schema. ({db_err})")
+
+        # Load the index, metadata and embedding model once for the whole process
+        self.retriever = get_retriever(config_path)
+
+    def select_schema_context(self, user_input, trace=None):
+        # Only the cached tables relevant to this fragment; refreshes happen in the background
+        with span(trace, "schema_load"):
+            if self.schema_cache:
+                self.schema_cache.get()
+            db_schema_context = self.schema_selector.select(user_input)
+        self.last_schema_context = db_schema_context
+        return db_schema_context
+
+    # Schema selection and vector retrieval are independent, so fetch them concurrently
+    def assemble_context(self, user_input, trace=None):
+        deadlines = self.config.get("context_deadlines", {})
+        start = time.perf_counter()
+
+        schema_future = self.context_pool.submit(self.select_schema_context, user_input, trace)
+        rag_future = self.context_pool.submit(
+            self.retriever.search, user_input, self.config["vector_store"]["top_k"], trace
+        )
+
+        # a late schema falls back to the last selection, late retrieval to no examples
+        db_schema_context = wait_for_source(
+            "Schema lookup", schema_future, start + deadlines.get("schema_ms", 500) / 1000, self.last_schema_context
+        )
+        similar_rows = wait_for_source(
+            "Vector retrieval", rag_future, start + deadlines.get("retrieval_ms", 1000) / 1000, []
+        )
+        return db_schema_context, format_context(similar_rows)
+
+    def clear_memory(self, session_id=None):
+        if session_id is None:
+            self.session_memory.clear()
+        else:
+            self.session_memory.pop(session_id, None)
+
+    def get_real_suggestion(self, user_input, on_token=None, request=None, session_id="local", trace=None):
+        config = self.config
+        try:
+            db_schema_context, rag_context = self.assemble_context(user_input, trace)
+
+            # Cached answer for the same fragment, schema version and neighbours
+            schema_fp = self.schema_cache.fingerprint if self.schema_cache else "no-schema"
+            if self.suggestion_cache:
+                cached = self.suggestion_cache.get(user_input, schema_fp, rag_context)
+                if cached is not None:
+                    print("⚡ Suggestion served from cache")
+                    if on_token is not None:
+                        on_token(cached)
+                    return cached, rag_context, db_schema_context
+
+            # A newer request makes this one stale; stop before paying for the LLM
+            if request is not None:
+                request.check()
+
+            with span(trace, "prompt_build"):
+                # Include session memory if enabled
+                memory = self.session_memory[session_id]
+                if config.get("memory", {}).get("enable", False):
+                    limit = config["memory"].get("limit", 3)
+                    session_context = "\n\n".join(memory[-limit:])
+                else:
+                    session_context = ""
+
+                # Build full LLM prompt context
+                parts = [db_schema_context, session_context, rag_context]
+                full_context = "\n\n".join([p for p in parts if p]).strip()
+
+            # Call LLM, streaming pieces to the caller when it wants them
+            with span(trace, "llm_total"):
+                if on_token is not None:
+                    response = ""
+                    for piece in stream_groq_llama(user_input=user_input, context=full_context, config=config, trace=trace):
+                        on_token(piece)
+                        response += piece
+                else:
+                    response = query_groq_llama(
+                        user_input=user_input,
+                        context=full_context,
+                        config=config,
+                        trace=trace
+                    )
+
+            if self.suggestion_cache:
+                self.suggestion_cache.put(user_input, schema_fp, rag_context, response)
+
+            # Append to session memory if enabled
+            if config.get("memory", {}).get("enable", False):
+                memory.append(f"Prompt: {user_input}\nResponse: {response}")
+
+            return response, rag_context, db_schema_context
+
+        except SuggestionCancelled:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Failed to get suggestion: {e}")
+            return ERROR_SUGGESTION, "", ""
@@ -0,0 +1,84 @@
+import itertools
+import queue
+import threading
+
+# returned in place of a suggestion when retrieval or the LLM call failed
+ERROR_SUGGESTION = "(error generating suggestion)"
+
+class SuggestionCancelled(Exception):
+    """Raised inside a worker when a newer request has superseded this one."""
+
+class SuggestionRequest:
+    def __init__(self, request_id, payload=None):
+        self.id = request_id
+        self.payload = payload
+        self.cancelled = threading.Event()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise SuggestionCancelled(f"request {self.id} superseded")
+
+class SuggestionPipeline:
+    """
+    Runs suggestion requests on worker threads so the keyboard hook only has
+    to enqueue. Each new request cancels the ones still in flight; workers
+    post (kind, request_id, data) events to a queue that the UI thread drains.
+    """
+
+    def __init__(self, handler, workers=2):
+        self.handler = handler
+        self.events = queue.Queue()
+        self._requests = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.current_id = None
+
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, payload=None):
+        with self._lock:
+            request = SuggestionRequest(next(self._ids), payload)
+            for stale in self._in_flight.values():
+                stale.cancelled.set()
+            self._in_flight[request.id] = request
+            self.current_id = request.id
+        self._requests.put(request)
+        return request.id
+
+    def cancel(self, request_id):
+        with self._lock:
+            request = self._in_flight.get(request_id)
+            if request:
+                request.cancelled.set()
+            if self.current_id == request_id:
+                self.current_id = None
+
+    # UI actions from the keyboard hook share the same queue as worker results
+    def post(self, kind, data=None):
+        self.events.put((kind, None, data))
+
+    def is_current(self, request_id):
+        return request_id == self.current_id
+
+    # events are dropped as soon as their request is stale
+    def _emitter(self, request):
+        def emit(kind, data=None):
+            request.check()
+            self.events.put((kind, request.id, data))
+        return emit
+
+    def _work(self):
+        while True:
+            request = self._requests.get()
+            try:
+                if not request.cancelled.is_set():
+                    self.handler(request, self._emitter(request))
+            except SuggestionCancelled:
+                print(f"⏭️ Dropped superseded suggestion request {request.id}")
+            except Exception as e:
+                print(f"[ERROR] Suggestion request {request.id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.pop(request.id, None)
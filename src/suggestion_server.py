@@ -0,0 +1,177 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import yaml
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from suggestion_engine import SuggestionEngine
+from suggestion_pipeline import SuggestionCancelled, SuggestionRequest
+from timing import LatencyStats, RequestTrace
+
+def read_param(config_path):
+    with open(config_path) as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+class CompleteRequest(BaseModel):
+    user_input: str
+    session_id: str = "local"
+
+class CompleteResponse(BaseModel):
+    suggestion: str
+    retrieved_context: str
+    db_schema: str
+    latency_ms: float
+    stages: dict = {}
+
+class MemoryRequest(BaseModel):
+    session_id: str = None
+
+def create_app(config_path="params.yaml"):
+    """
+    One warm SuggestionEngine (model, index, metadata, schema cache) shared by
+    every editor on the host. At most max_concurrency suggestions run at once;
+    callers that cannot get a slot within queue_timeout_s get a 503.
+    """
+    config = read_param(config_path)
+    server_cfg = config.get("server", {})
+
+    engine = SuggestionEngine(config, config_path, db_cfg=config.get("db"))
+    # the retriever batch already shares one encoder pass, so the embedder is not batched again
+    search_cfg = server_cfg.get("search_batch", {})
+    engine.retriever.enable_batching(
+        max_batch=search_cfg.get("max_batch", 32),
+        max_wait_ms=search_cfg.get("max_wait_ms", 5)
+    )
+
+    app = FastAPI(title="SQL suggestion server")
+    slots = asyncio.Semaphore(server_cfg.get("max_concurrency", 4))
+    queue_timeout = server_cfg.get("queue_timeout_s", 10)
+    request_ids = itertools.count(1)
+    latency = LatencyStats(server_cfg.get("latency_window", 1000))
+
+    async def acquire_slot():
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="suggestion server is busy")
+
+    @app.get("/health")
+    def health():
+        return {
+            "status": "ok",
+            "model": config["llm"]["model_name"],
+            "embedding_model": config["embedding_model"],
+            "vector_store": config["vector_store"]["type"],
+            "schema_cached": engine.schema_cache is not None
+        }
+
+    # p50/p95/p99 per stage over the most recent requests
+    @app.get("/metrics")
+    def metrics():
+        return latency.summary()
+
+    @app.post("/complete", response_model=CompleteResponse)
+    async def complete(body: CompleteRequest):
+        await acquire_slot()
+        try:
+            trace = RequestTrace()
+            suggestion, retrieved_context, db_schema = await run_in_threadpool(
+                engine.get_real_suggestion, body.user_input, session_id=body.session_id, trace=trace
+            )
+            latency_ms = round(trace.elapsed_ms(), 2)
+            latency.add(trace, latency_ms)
+            return CompleteResponse(
+                suggestion=suggestion,
+                retrieved_context=retrieved_context,
+                db_schema=db_schema,
+                latency_ms=latency_ms,
+                stages=trace.as_dict()
+            )
+        finally:
+            slots.release()
+
+    # Server-sent events: {"token": ...} per piece, then {"done": true, ...} with the full result
+    @app.post("/complete/stream")
+    async def complete_stream(body: CompleteRequest, http_request: Request):
+        await acquire_slot()
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        request = SuggestionRequest(next(request_ids), body.user_input)
+
+        def push(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        def on_token(piece):
+            request.check()
+            push({"token": piece})
+
+        def run():
+            trace = RequestTrace()
+            try:
+                suggestion, retrieved_context, db_schema = engine.get_real_suggestion(
+                    body.user_input, on_token=on_token, request=request, session_id=body.session_id, trace=trace
+                )
+                latency_ms = round(trace.elapsed_ms(), 2)
+                latency.add(trace, latency_ms)
+                push({
+                    "done": True,
+                    "suggestion": suggestion,
+                    "retrieved_context": retrieved_context,
+                    "db_schema": db_schema,
+                    "latency_ms": latency_ms,
+                    "stages": trace.as_dict()
+                })
+            except SuggestionCancelled:
+                push(None)
+            except Exception as e:
+                push({"error": str(e)})
+            finally:
+                loop.call_soon_threadsafe(slots.release)
+
+        threading.Thread(target=run, daemon=True).start()
+
+        async def stream():
+            try:
+                while True:
+                    event = await events.get()
+                    if event is None:
+                        break
+                    yield f"data: {json.dumps(event)}\n\n"
+                    if "done" in event or "error" in event:
+                        break
+            finally:
+                # client went away or stream ended: stop the engine at its next checkpoint
+                request.cancelled.set()
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/memory/clear")
+    def clear_memory(body: MemoryRequest):
+        engine.clear_memory(body.session_id)
+        return {"status": "cleared"}
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = argparse.ArgumentParser()
+    args.add_argument("--config", default="params.yaml")
+    args.add_argument("--host", default=None)
+    args.add_argument("--port", type=int, default=None)
+    parsed_args = args.parse_args()
+
+    server_cfg = read_param(parsed_args.config).get("server", {})
+    uvicorn.run(
+        create_app(parsed_args.config),
+        host=parsed_args.host or server_cfg.get("host", "127.0.0.1"),
+        port=parsed_args.port or server_cfg.get("port", 8765)
+    )
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+
+# Stages of one suggestion, in the order they happen
+STAGES = [
+    "clipboard_wait",
+    "schema_load",
+    "lexical_search",
+    "embedding",
+    "vector_search",
+    "prompt_build",
+    "llm_ttfb",
+    "llm_total",
+    "typing",
+]
+
+PERCENTILES = (50, 95, 99)
+
+class RequestTrace:
+    """
+    Per-request stage timings in milliseconds, measured with perf_counter.
+    Travels with the request from the hotkey to the typed ghost text; a stage
+    recorded more than once (e.g. typing streamed pieces) accumulates.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, ms):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def since(self, stage, start):
+        self.record(stage, (time.perf_counter() - start) * 1000)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.since(stage, start)
+
+    # stages measured elsewhere, e.g. returned by the suggestion server
+    def merge(self, stages):
+        for stage, ms in (stages or {}).items():
+            self.record(stage, ms)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(ms, 2) for stage, ms in self.stages.items()}
+
+# Null-safe helper so callers can pass trace=None
+@contextmanager
+def span(trace, stage):
+    if trace is None:
+        yield
+    else:
+        with trace.span(stage):
+            yield
+
+class LatencyStats:
+    """Rolling window of recent samples per stage, summarised as p50/p95/p99."""
+
+    def __init__(self, window=1000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def add(self, trace, total_ms=None):
+        with self._lock:
+            for stage, ms in trace.as_dict().items():
+                self._samples[stage].append(ms)
+            if total_ms is not None:
+                self._samples["total"].append(total_ms)
+
+    def summary(self):
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+        order = STAGES + ["total"]
+        summary = {}
+        for stage in sorted(snapshot, key=lambda s: order.index(s) if s in order else len(order)):
+            values = np.asarray(snapshot[stage], dtype=np.float64)
+            summary[stage] = {"count": int(values.size)}
+            for p in PERCENTILES:
+                summary[stage][f"p{p}"] = round(float(np.percentile(values, p)), 2)
+        return summary
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
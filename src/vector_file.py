@@ -0,0 +1,126 @@
+import json
+import os
+import numpy as np
+from store_versions import new_version_dir, publish_version, store_dir
+
+# On-disk layout (one versioned directory next to the index as <index>.vectors,
+# see store_versions.py):
+#   meta.json     dimension and row count, written last
+#   vectors.bin   float32 rows, back to back
+#   keys.bin      int64 row key per vector, one row per key
+META_FILE = "meta.json"
+
+# live rows copied forward per step by an incremental build
+COPY_BLOCK_ROWS = 65536
+
+def _read_meta(path):
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def is_vector_file(path):
+    return _read_meta(store_dir(path)) is not None
+
+class VectorFileWriter:
+    """
+    Writes full-precision vectors for re-ranking compact FAISS codes into a
+    new version of the store. With append, the live rows of the current
+    version that were neither deleted nor rewritten are copied forward on
+    close, so the file only ever holds one row per live key.
+    """
+
+    def __init__(self, path, append=False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.previous = VectorFile(path) if append and is_vector_file(path) else None
+        self.dim = self.previous.dim if self.previous is not None else None
+        self.num_rows = 0
+        self._dropped = set()
+        self.version_dir = new_version_dir(path)
+        self._vectors = open(os.path.join(self.version_dir, "vectors.bin"), "wb")
+        self._keys = open(os.path.join(self.version_dir, "keys.bin"), "wb")
+
+    def _write(self, keys, vectors):
+        self._vectors.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._keys.write(np.asarray(keys, dtype=np.int64).tobytes())
+        self.num_rows += len(keys)
+
+    def delete(self, keys):
+        self._dropped.update(int(k) for k in keys)
+
+    def append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self._dropped.update(int(k) for k in keys)
+        self._write(keys, vectors)
+
+    def _copy_live_rows(self):
+        previous = self.previous
+        keys = np.unique(np.asarray(previous.keys))
+        if self._dropped:
+            keys = keys[~np.isin(keys, np.fromiter(self._dropped, dtype=np.int64))]
+        rows, _ = previous.rows_for_keys(keys)
+        order = np.argsort(rows)
+        keys, rows = keys[order], rows[order]
+        for start in range(0, len(rows), COPY_BLOCK_ROWS):
+            block = rows[start:start + COPY_BLOCK_ROWS]
+            self._write(keys[start:start + COPY_BLOCK_ROWS], previous.vectors[block])
+
+    def close(self):
+        try:
+            if self.previous is not None:
+                self._copy_live_rows()
+        finally:
+            self._vectors.close()
+            self._keys.close()
+        with open(os.path.join(self.version_dir, META_FILE), "w") as f:
+            json.dump({"dim": self.dim, "num_rows": self.num_rows}, f)
+        self.previous = None
+        publish_version(self.path, self.version_dir)
+
+class VectorFile:
+    """Memory-mapped full-precision vectors looked up by row key."""
+
+    def __init__(self, path):
+        path = store_dir(path)
+        meta = _read_meta(path)
+        if meta is None:
+            raise FileNotFoundError(f"No re-ranking vectors at {path}; rebuild the vector store")
+        self.dim = meta["dim"]
+        n = meta["num_rows"]
+        if n:
+            self.vectors = np.memmap(os.path.join(path, "vectors.bin"), dtype=np.float32, mode="r", shape=(n, self.dim))
+            self.keys = np.memmap(os.path.join(path, "keys.bin"), dtype=np.int64, mode="r", shape=(n,))
+        else:
+            # zero-length files cannot be mapped
+            self.vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+            self.keys = np.zeros(0, dtype=np.int64)
+        # stable sort keeps file order, so the last row of a key is its newest
+        self._order = np.argsort(self.keys, kind="stable")
+        self._sorted = np.asarray(self.keys[self._order])
+
+    def rows_for_keys(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self._sorted):
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        pos = np.searchsorted(self._sorted, keys, side="right") - 1
+        found = (pos >= 0) & (self._sorted[np.maximum(pos, 0)] == keys)
+        return self._order[np.maximum(pos, 0)], found
+
+def rerank(query_vector, candidate_keys, vector_file, top_k):
+    """Exact L2 re-ranking of candidate keys; returns [(key, distance)] nearest first."""
+    keys = np.asarray([k for k in candidate_keys if k != -1], dtype=np.int64)
+    if not len(keys):
+        return []
+    rows, found = vector_file.rows_for_keys(keys)
+    keys, rows = keys[found], rows[found]
+    # memmap reads go in file order
+    order = np.argsort(rows)
+    vectors = np.asarray(vector_file.vectors[rows[order]])
+    distances = np.empty(len(rows), dtype=np.float32)
+    distances[order] = ((vectors - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+    best = np.argsort(distances, kind="stable")[:top_k]
+    return [(int(keys[i]), float(distances[i])) for i in best]